@@ -1,66 +1,339 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import requests
 import io
 import base64
-from PIL import Image, ImageDraw, ImageFont
-import openai
+from PIL import Image, ImageDraw, ImageFilter, ImageStat
 import os
 from datetime import datetime
 import json
+import re
 import time
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
 import math
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import shutil
+import tempfile
+import sqlite3
+import weakref
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from cache import DiskImageCache, ResponseCache, normalized_payload_key, payload_key
+from fonts import get_font, text_width
+from metrics import metrics, serve_metrics, write_metrics_file
+from ratelimit import ProviderLimiter, RateLimitError, TokenBucket, backoff_delay
+
+@functools.lru_cache(maxsize=None)
+def _load_secrets() -> Dict:
+    """secrets.toml as a plain dict, parsed once per process ({} if there is none).
+
+    Without a secrets.toml every st.secrets lookup would search for the
+    file again (and show an error on the page), so it is only tried once.
+    """
+    if not st.secrets.load_if_toml_exists():
+        return {}
+    return dict(st.secrets)
+
+
+def get_secret(name: str, default=None):
+    """Read a setting from st.secrets, falling back to the environment."""
+    return _load_secrets().get(name, os.environ.get(name, default))
+
+
+@functools.lru_cache(maxsize=None)
+def _api_key_problem() -> Optional[str]:
+    if not get_secret("GROQ_API_KEY"):
+        return "GROQ API key is not set. Please set it in your secrets.toml file."
+    if not get_secret("STABILITY_API_KEY"):
+        return "Stability API key is not set. Please set it in your secrets.toml file."
+    return None
+
 
 def validate_api_keys():
-    """Validate that required API keys are set."""
-    if not st.secrets.get("GROQ_API_KEY"):
-        st.error("GROQ API key is not set. Please set it in your secrets.toml file.")
-        return False
-    if not st.secrets.get("STABILITY_API_KEY"):
-        st.error("Stability API key is not set. Please set it in your secrets.toml file.")
+    """Validate that required API keys are set (checked once per process)."""
+    problem = _api_key_problem()
+    if problem:
+        st.error(problem)
         return False
     return True
 
-GROQ_API_KEY = st.secrets.get("GROQ_API_KEY", "")
-STABILITY_API_KEY = st.secrets.get("STABILITY_API_KEY", "")
+GROQ_API_KEY = get_secret("GROQ_API_KEY", "")
+STABILITY_API_KEY = get_secret("STABILITY_API_KEY", "")
 
 SOCIAL_MEDIA_CREDENTIALS = {
-    "instagram": st.secrets.get("INSTAGRAM_TOKEN", ""),
-    "facebook": st.secrets.get("FACEBOOK_TOKEN", ""),
-    "twitter": st.secrets.get("TWITTER_TOKEN", ""),
-    "linkedin": st.secrets.get("LINKEDIN_TOKEN", "")
+    "instagram": get_secret("INSTAGRAM_TOKEN", ""),
+    "facebook": get_secret("FACEBOOK_TOKEN", ""),
+    "twitter": get_secret("TWITTER_TOKEN", ""),
+    "linkedin": get_secret("LINKEDIN_TOKEN", "")
+}
+
+def build_caption_prompt(context: Dict) -> str:
+    """Caption prompt for a design context (hotel, occasion, audience, ...)."""
+    feature_text = ", ".join(context.get("features") or []) or "our wonderful amenities"
+    special_offer = context.get("special_offer")
+    return f"""
+    Create a short, engaging social media post (max 100 words) for {context["hotel_name"]} in {context["hotel_location"]} 
+    promoting a {context["occasion"]}. Target audience: {context["audience"]}. 
+    Highlight these features: {feature_text}.
+    {"Include this special offer: " + special_offer if special_offer else ""}
+    The tone should be professional yet warm and inviting.
+    """
+
+
+def build_image_prompt(context: Dict) -> str:
+    """Background image prompt for a design context."""
+    features = context.get("features") or []
+    image_style = context.get("image_style") or "Professional hotel photography, warm lighting, inviting atmosphere, high quality"
+    return f"""
+    {image_style}. 
+    A beautiful view of a {context.get("hotel_type", "Heritage")} hotel for a {context["occasion"]} promotion, 
+    {"featuring " + ", ".join(features[:3]) if features else ""}
+    Perfect for {context["audience"]}. No text on the image.
+    """
+
+
+# Keep-alive pool settings for the shared HTTP client. HTTP_POOL_SIZE is the
+# number of connections kept open per host; HTTP_POOL_HOSTS is how many
+# distinct hosts (Groq, Stability, ...) keep a pool at the same time.
+HTTP_POOL_SIZE = int(get_secret("HTTP_POOL_SIZE", 10))
+HTTP_POOL_HOSTS = int(get_secret("HTTP_POOL_HOSTS", 4))
+HTTP_WARMUP = str(get_secret("HTTP_WARMUP", "true")).lower() in ("1", "true", "yes")
+
+
+class PooledHTTPClient:
+    """A requests.Session with per-host keep-alive connection pools.
+
+    One instance is shared by every backend call in the process, so Streamlit
+    sessions and reruns reuse open TCP+TLS connections to api.groq.com and
+    api.stability.ai instead of handshaking on every request.
+    """
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, pool_hosts: int = HTTP_POOL_HOSTS):
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.session.post(url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.session.get(url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-host request, new-connection and reused-connection counts."""
+        pools = self._adapter.poolmanager.pools
+        stats = {}
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}"
+            host_stats = stats.setdefault(host, {"requests": 0, "connections": 0, "reused": 0})
+            host_stats["requests"] += pool.num_requests
+            host_stats["connections"] += pool.num_connections
+            host_stats["reused"] += max(0, pool.num_requests - pool.num_connections)
+        return stats
+
+    def warm(self, urls: List[str], timeout: float = 5.0):
+        """Open a pooled connection to each URL's host ahead of the first real request."""
+        for url in urls:
+            try:
+                self.session.head(url, timeout=timeout).close()
+            except requests.exceptions.RequestException:
+                pass
+
+    def close(self):
+        self.session.close()
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+_warmup_thread = None
+
+
+def get_http_client() -> PooledHTTPClient:
+    """Return the process-wide HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = PooledHTTPClient()
+    return _http_client
+
+
+def warm_connections():
+    """Handshake with the API hosts on a background thread, once per process.
+
+    The TCP and TLS setup then happens while the user fills in the form
+    rather than on their first Generate click.
+    """
+    global _warmup_thread
+    if not HTTP_WARMUP:
+        return
+    with _http_client_lock:
+        if _warmup_thread is not None:
+            return
+        urls = [url for url in (GROQ_BASE_URL, STABILITY_BASE_URL) if url]
+        _warmup_thread = threading.Thread(target=lambda: get_http_client().warm(urls),
+                                          name="bookingjini-warmup", daemon=True)
+    _warmup_thread.start()
+
+
+# In-process cache for Groq taglines and captions. Keys are built from the
+# whitespace-normalised request, and each key keeps up to LLM_CACHE_VARIANTS
+# responses so repeated requests still see some variety. A key serves hits
+# from its first response; its other variants fill in on occasional misses.
+LLM_CACHE_TTL = float(get_secret("LLM_CACHE_TTL", 3600))
+LLM_CACHE_MAX_ENTRIES = int(get_secret("LLM_CACHE_MAX_ENTRIES", 512))
+LLM_CACHE_VARIANTS = int(get_secret("LLM_CACHE_VARIANTS", 3))
+
+llm_cache = ResponseCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL, LLM_CACHE_VARIANTS)
+
+# API hosts can be pointed at a local stand-in (mock_api.py) for benchmarks
+GROQ_BASE_URL = get_secret("GROQ_BASE_URL", "https://api.groq.com")
+STABILITY_BASE_URL = get_secret("STABILITY_BASE_URL", "https://api.stability.ai")
+GROQ_CHAT_URL = f"{GROQ_BASE_URL.rstrip('/')}/openai/v1/chat/completions"
+
+# Stream captions token by token (server-sent events) where the UI supports it
+CAPTION_STREAMING = str(get_secret("CAPTION_STREAMING", "true")).lower() in ("1", "true", "yes")
+
+# Process-wide rate limits per provider, shared by every session. Requests
+# queue per session and are served round robin; 429 responses pause the
+# provider's queue for Retry-After (plus jitter) before retrying.
+RATE_LIMIT_RETRIES = int(get_secret("RATE_LIMIT_RETRIES", 3))
+RATE_LIMIT_MAX_WAIT = float(get_secret("RATE_LIMIT_MAX_WAIT", 120))
+rate_limiters = {
+    "groq": ProviderLimiter("Groq", rpm=float(get_secret("GROQ_RPM", 30)), tpm=float(get_secret("GROQ_TPM", 6000)),
+                            max_wait=RATE_LIMIT_MAX_WAIT),
+    "stability": ProviderLimiter("Stability AI", rpm=float(get_secret("STABILITY_RPM", 150)),
+                                 max_wait=RATE_LIMIT_MAX_WAIT),
 }
+_rate_limit_local = threading.local()
+
+
+def _rate_limit_client() -> str:
+    """Queue key for the caller: its Streamlit session, else its thread."""
+    client = getattr(_rate_limit_local, "client", None)
+    if client is None:
+        ctx = get_script_run_ctx()
+        client = ctx.session_id if ctx is not None else threading.current_thread().name
+    return client
+
+
+def _as_client(client: str, func, *args):
+    """Run func in a worker thread on behalf of the given rate-limit client."""
+    _rate_limit_local.client = client
+    try:
+        return func(*args)
+    finally:
+        _rate_limit_local.client = None
+
+
+def _timed_job(timings: Dict, field: str, client: str, func, *args):
+    start = time.perf_counter()
+    try:
+        return _as_client(client, func, *args)
+    finally:
+        timings[field] = time.perf_counter() - start
+
+
+def _estimate_tokens(data: Dict) -> int:
+    """Rough prompt + completion token count for a chat request (4 chars/token)."""
+    prompt_chars = sum(len(message["content"]) for message in data.get("messages", []))
+    return prompt_chars // 4 + int(data.get("max_tokens", 0))
+
+
+def _retry_after(response: requests.Response, default: Optional[float]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (seconds form), or default."""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def _limited_post(provider: str, url: str, tokens: int = 0, **kwargs) -> requests.Response:
+    """POST through the provider's rate limiter, retrying 429 responses.
+
+    Raises RateLimitError when the provider keeps answering 429 or the
+    queue wait would exceed RATE_LIMIT_MAX_WAIT.
+    """
+    limiter = rate_limiters[provider]
+    client = _rate_limit_client()
+    for attempt in range(1, RATE_LIMIT_RETRIES + 2):
+        limiter.acquire(tokens, client=client)
+        response = get_http_client().post(url, **kwargs)
+        if response.status_code != 429:
+            return response
+        response.close()
+        retry_after = _retry_after(response, None)
+        limiter.penalize(backoff_delay(attempt, retry_after=retry_after))
+    raise RateLimitError(f"{limiter.name} is busy (rate limited). Please wait a moment and try again.")
+
+
+def _record_token_usage(provider: str, estimated: int, body: Dict):
+    usage = body.get("usage") or {}
+    if usage.get("total_tokens"):
+        rate_limiters[provider].record_usage(estimated, usage["total_tokens"])
+
+
+def rate_limit_stats() -> Dict[str, Dict]:
+    """Queue depth, throttling and wait times per provider."""
+    return {provider: limiter.stats() for provider, limiter in rate_limiters.items()}
+
+
+def _request_tagline(hotel_name: str, occasion: str, audience: str) -> str:
+    """Call Groq for a promotional tagline, raising on any failure."""
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+    # Special handling for Indian festivals
+    festival_context = ""
+    if occasion in ["Diwali", "Holi", "Independence Day", "Republic Day"]:
+        festival_context = f"Create a culturally appropriate and festive tagline for {occasion} that resonates with Indian audiences. "
+
+    data = {
+        "model": "llama-3.3-70b-versatile",
+        "messages": [
+            {"role": "system",
+             "content": "You are a branding expert specializing in Indian hospitality and festivals. Create catchy promotional taglines (max 10 words) that blend traditional values with modern appeal."},
+            {"role": "user",
+             "content": f"{festival_context}Create a short and catchy promotional tagline (max 10 words) for {hotel_name}. Occasion: {occasion}. Target Audience: {audience}. Keep it engaging, professional, and culturally appropriate."}
+        ],
+        "temperature": 0.9,
+        "max_tokens": 20
+    }
+
+    with metrics.track("tagline") as sample:
+        cache_key = normalized_payload_key(data)
+        cached = llm_cache.get(cache_key)
+        sample["cache_hit"] = cached is not None
+        if cached is not None:
+            sample["payload_bytes"] = len(cached.encode("utf-8"))
+            return cached
+
+        estimated = _estimate_tokens(data)
+        response = _limited_post("groq", GROQ_CHAT_URL, estimated, headers=headers, json=data)
+        response.raise_for_status()
+        sample["payload_bytes"] = len(response.content)
+        body = response.json()
+        _record_token_usage("groq", estimated, body)
+        tagline = body["choices"][0]["message"]["content"].strip().strip('"')
+        llm_cache.put(cache_key, tagline)
+        return tagline
+
 
 def generate_promotional_tagline(hotel_name: str, occasion: str, audience: str) -> str:
     if not GROQ_API_KEY:
         return "Please set your GROQ API key in the app settings."
 
     try:
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        # Special handling for Indian festivals
-        festival_context = ""
-        if occasion in ["Diwali", "Holi", "Independence Day", "Republic Day"]:
-            festival_context = f"Create a culturally appropriate and festive tagline for {occasion} that resonates with Indian audiences. "
-
-        data = {
-            "model": "llama-3.3-70b-versatile",
-            "messages": [
-                {"role": "system",
-                 "content": "You are a branding expert specializing in Indian hospitality and festivals. Create catchy promotional taglines (max 10 words) that blend traditional values with modern appeal."},
-                {"role": "user",
-                 "content": f"{festival_context}Create a short and catchy promotional tagline (max 10 words) for {hotel_name}. Occasion: {occasion}. Target Audience: {audience}. Keep it engaging, professional, and culturally appropriate."}
-            ],
-            "temperature": 0.9,
-            "max_tokens": 20
-        }
-
-        response = requests.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=data)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"].strip().strip('"')
+        return _request_tagline(hotel_name, occasion, audience)
 
     except Exception as e:
         st.error(f"Error generating tagline: {str(e)}")
@@ -68,95 +341,627 @@ def generate_promotional_tagline(hotel_name: str, occasion: str, audience: str)
     
 
 
-def generate_text_with_llama(prompt: str) -> str:
+# Variant mode: several candidate images and taglines per request
+MAX_VARIANTS = int(get_secret("MAX_VARIANTS", 4))
+VARIANT_THUMBNAIL_SIZE = 256
+
+
+def _tagline_variants_request_data(hotel_name: str, occasion: str, audience: str, count: int) -> Dict:
+    festival_context = ""
+    if occasion in ["Diwali", "Holi", "Independence Day", "Republic Day"]:
+        festival_context = f"Make them culturally appropriate and festive for {occasion}, resonating with Indian audiences. "
+
+    return {
+        "model": "llama-3.3-70b-versatile",
+        "messages": [
+            {"role": "system",
+             "content": "You are a branding expert specializing in Indian hospitality and festivals. Create catchy promotional taglines (max 10 words) that blend traditional values with modern appeal."},
+            {"role": "user",
+             "content": f"{festival_context}Create {count} different short and catchy promotional taglines (max 10 words each) for {hotel_name}. Occasion: {occasion}. Target Audience: {audience}. Keep them engaging, professional, and culturally appropriate. Reply with only a JSON object of the form {{\"taglines\": [\"...\", ...]}}."}
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.9,
+        "max_tokens": 20 * count
+    }
+
+
+def _parse_tagline_variants(content: str, count: int) -> List[str]:
+    """Distinct valid taglines from a variants reply; raises ValueError if there are none."""
+    reply = json.loads(content, strict=False)
+    candidates = reply.get("taglines") if isinstance(reply, dict) else reply
+    if not isinstance(candidates, list):
+        raise ValueError("reply has no taglines list")
+    taglines = []
+    for tagline in candidates:
+        if not isinstance(tagline, str):
+            continue
+        tagline = tagline.strip().strip('"')
+        if tagline and len(tagline.split()) <= TAGLINE_MAX_WORDS and tagline not in taglines:
+            taglines.append(tagline)
+    if not taglines:
+        raise ValueError("reply has no valid taglines")
+    return taglines[:count]
+
+
+def _request_tagline_variants(hotel_name: str, occasion: str, audience: str, count: int) -> List[str]:
+    """Call Groq once for up to ``count`` taglines, raising on any request failure.
+
+    Groq only returns one completion per request, so the taglines are asked
+    for as a JSON list. An unusable reply falls back to a single tagline.
+    """
+    if count <= 1:
+        return [_request_tagline(hotel_name, occasion, audience)]
+
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    data = _tagline_variants_request_data(hotel_name, occasion, audience, count)
+
+    with metrics.track("tagline_variants") as sample:
+        cache_key = normalized_payload_key(data)
+        cached = llm_cache.get(cache_key)
+        sample["cache_hit"] = cached is not None
+        if cached is not None:
+            sample["payload_bytes"] = len(cached.encode("utf-8"))
+            return json.loads(cached)
+
+        estimated = _estimate_tokens(data)
+        response = _limited_post("groq", GROQ_CHAT_URL, estimated, headers=headers, json=data)
+        response.raise_for_status()
+        sample["payload_bytes"] = len(response.content)
+        body = response.json()
+        _record_token_usage("groq", estimated, body)
+        try:
+            taglines = _parse_tagline_variants(body["choices"][0]["message"]["content"], count)
+        except (KeyError, IndexError, TypeError, ValueError):
+            sample["error"] = True
+            taglines = None
+        else:
+            llm_cache.put(cache_key, json.dumps(taglines))
+
+    if taglines is None:
+        taglines = [_request_tagline(hotel_name, occasion, audience)]
+    return taglines
+
+
+def generate_tagline_variants(hotel_name: str, occasion: str, audience: str, count: int) -> List[str]:
     if not GROQ_API_KEY:
-        return "Please set your GROQ API key in the app settings."
+        return ["Please set your GROQ API key in the app settings."]
 
     try:
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        # Enhance the prompt for better context
-        enhanced_prompt = f"""
-        Create a short, engaging social media post (max 100 words) that:
-        1. Uses warm, inviting language
-        2. Highlights the unique aspects of the occasion
-        3. Appeals to the target audience
-        4. Includes relevant cultural elements for Indian festivals
-        5. Maintains a professional yet friendly tone
-        
-        {prompt}
-        """
+        return _request_tagline_variants(hotel_name, occasion, audience, count)
 
-        data = {
-            "model": "llama-3.3-70b-versatile",
-            "messages": [
-                {"role": "system",
-                 "content": "You are a professional social media marketer specializing in Indian hospitality and festivals. Create engaging captions that blend traditional values with modern appeal."},
-                {"role": "user", "content": enhanced_prompt}
-            ],
-            "temperature": 0.8,
-            "max_tokens": 150
-        }
-
-        response = requests.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=data)
+    except Exception as e:
+        st.error(f"Error generating tagline: {str(e)}")
+        return ["Error generating tagline. Please try again."]
+
+
+def _caption_request_data(prompt: str) -> Dict:
+    # Enhance the prompt for better context
+    enhanced_prompt = f"""
+    Create a short, engaging social media post (max 100 words) that:
+    1. Uses warm, inviting language
+    2. Highlights the unique aspects of the occasion
+    3. Appeals to the target audience
+    4. Includes relevant cultural elements for Indian festivals
+    5. Maintains a professional yet friendly tone
+    
+    {prompt}
+    """
+
+    return {
+        "model": "llama-3.3-70b-versatile",
+        "messages": [
+            {"role": "system",
+             "content": "You are a professional social media marketer specializing in Indian hospitality and festivals. Create engaging captions that blend traditional values with modern appeal."},
+            {"role": "user", "content": enhanced_prompt}
+        ],
+        "temperature": 0.8,
+        "max_tokens": 150
+    }
+
+
+def _request_caption(prompt: str) -> str:
+    """Call Groq for a social media caption, raising on any failure."""
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    data = _caption_request_data(prompt)
+
+    with metrics.track("caption") as sample:
+        cache_key = normalized_payload_key(data)
+        cached = llm_cache.get(cache_key)
+        sample["cache_hit"] = cached is not None
+        if cached is not None:
+            sample["payload_bytes"] = len(cached.encode("utf-8"))
+            return cached
+
+        estimated = _estimate_tokens(data)
+        response = _limited_post("groq", GROQ_CHAT_URL, estimated, headers=headers, json=data)
         response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"].strip()
+        sample["payload_bytes"] = len(response.content)
+        body = response.json()
+        _record_token_usage("groq", estimated, body)
+        caption = body["choices"][0]["message"]["content"].strip()
+        llm_cache.put(cache_key, caption)
+        return caption
+
+
+def _stream_caption(prompt: str, stats: Dict) -> Iterator[str]:
+    """Yield caption tokens from Groq's streaming endpoint, raising on failure.
+
+    Falls back to a single non-streaming request when streaming is disabled
+    or the stream cannot be opened. stats receives "mode" ("stream",
+    "fallback" or "cache"), "ttft" (seconds to the first token) and "total".
+    """
+    start = time.perf_counter()
+    data = _caption_request_data(prompt)
+    cache_key = normalized_payload_key(data)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        stats.update(mode="cache", ttft=time.perf_counter() - start, total=time.perf_counter() - start)
+        metrics.observe("caption", stats["total"], payload_bytes=len(cached.encode("utf-8")), cache_hit=True)
+        yield cached
+        return
+
+    response = _open_chat_stream(data)
+    if response is None:
+        caption = _request_caption(prompt)
+        stats.update(mode="fallback", ttft=time.perf_counter() - start, total=time.perf_counter() - start)
+        yield caption
+        return
+
+    parts = []
+    try:
+        for token in _iter_stream_tokens(response):
+            if not parts:
+                stats.update(mode="stream", ttft=time.perf_counter() - start)
+            parts.append(token)
+            yield token
+    except Exception:
+        metrics.observe("caption", time.perf_counter() - start, error=True, cache_hit=False)
+        raise
+
+    stats["total"] = time.perf_counter() - start
+    caption = "".join(parts).strip()
+    metrics.observe("caption", stats["total"], payload_bytes=len(caption.encode("utf-8")), cache_hit=False)
+    if caption:
+        llm_cache.put(cache_key, caption)
+
+
+def _open_chat_stream(data: Dict) -> Optional[requests.Response]:
+    """Open a streaming Groq chat completion, or None if streaming is off or fails."""
+    if not CAPTION_STREAMING:
+        return None
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream"
+    }
+    response = None
+    try:
+        response = _limited_post("groq", GROQ_CHAT_URL, _estimate_tokens(data), headers=headers,
+                                 json={**data, "stream": True}, stream=True)
+        response.raise_for_status()
+        if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+            raise ValueError("Groq did not return an event stream")
+        return response
+    except (requests.exceptions.RequestException, ValueError):
+        if response is not None:
+            response.close()
+        return None
+
+
+def _iter_stream_tokens(response: requests.Response) -> Iterator[str]:
+    """Content tokens from a server-sent events chat completion."""
+    # SSE is UTF-8; without a charset requests would assume Latin-1
+    response.encoding = "utf-8"
+    with response:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            token = json.loads(payload)["choices"][0].get("delta", {}).get("content")
+            if token:
+                yield token
+
+
+def generate_text_with_llama(prompt: str) -> str:
+    if not GROQ_API_KEY:
+        return "Please set your GROQ API key in the app settings."
+
+    try:
+        return _request_caption(prompt)
 
     except Exception as e:
         st.error(f"Error generating text: {str(e)}")
         return "Error generating text. Please try again."
 
 
-def generate_image_with_stability(prompt: str) -> Optional[Image.Image]:
-    if not STABILITY_API_KEY:
-        st.warning("Please set your Stability API key in the app settings.")
-        return None
+def stream_text_with_llama(prompt: str, stats: Optional[Dict] = None) -> Iterator[str]:
+    """Streaming variant of generate_text_with_llama for st.write_stream.
 
+    Tokens are yielded as they arrive. Pass a dict as stats to receive the
+    time to first token ("ttft"), total time and which path served it.
+    """
+    if not GROQ_API_KEY:
+        yield "Please set your GROQ API key in the app settings."
+        return
+
+    stats = stats if stats is not None else {}
+    produced = False
     try:
-        # Updated Stability AI API endpoint
-        url = "https://api.stability.ai/v1/generation/stable-diffusion-v1-6/text-to-image"
-
-        headers = {
-            "Authorization": f"Bearer {STABILITY_API_KEY}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-
-        # Enhance the prompt for better image generation
-        enhanced_prompt = f"""
-        Professional hotel photography, {prompt}
-        High quality, 4K resolution, perfect lighting, architectural details, inviting atmosphere
-        No text or watermarks, suitable for social media
-        """
+        for token in _stream_caption(prompt, stats):
+            if token:
+                produced = True
+                yield token
+    except Exception as e:
+        st.error(f"Error generating text: {str(e)}")
+    if not produced:
+        # st.write_stream returns a list, not a str, when nothing was written
+        yield GENERATION_FALLBACKS["text"]
 
-        payload = {
-            "text_prompts": [
-                {"text": enhanced_prompt},
-                {"text": "blurry, low quality, distorted, text, watermark, signature", "weight": -1}
-            ],
-            "cfg_scale": 7,
-            "height": 1024,
-            "width": 1024,
-            "samples": 1,
-            "steps": 30,
-        }
 
-        response = requests.post(url, headers=headers, json=payload)
-        
+# Caption and tagline from one Groq request returning JSON. Replies that do
+# not parse or validate fall back to the separate caption and tagline calls.
+CAPTION_TAGLINE_COMBINED = str(get_secret("CAPTION_TAGLINE_COMBINED", "true")).lower() in ("1", "true", "yes")
+TAGLINE_MAX_WORDS = 15
+_CAPTION_FIELD = re.compile(r'"caption"\s*:\s*"')
+
+
+def _combined_request_data(prompt: str, hotel_name: str, occasion: str, audience: str) -> Dict:
+    festival_context = ""
+    if occasion in ["Diwali", "Holi", "Independence Day", "Republic Day"]:
+        festival_context = f"Make the tagline culturally appropriate and festive for {occasion}, resonating with Indian audiences. "
+
+    user_prompt = f"""
+    Write a promotional tagline and a social media post for {hotel_name}.
+    Occasion: {occasion}. Target Audience: {audience}.
+
+    The tagline must be short and catchy (max 10 words). {festival_context}
+    The post (max 100 words) must:
+    1. Use warm, inviting language
+    2. Highlight the unique aspects of the occasion
+    3. Appeal to the target audience
+    4. Include relevant cultural elements for Indian festivals
+    5. Maintain a professional yet friendly tone
+
+    {prompt}
+
+    Reply with only a JSON object of the form {{"tagline": "...", "caption": "..."}}.
+    """
+
+    return {
+        "model": "llama-3.3-70b-versatile",
+        "messages": [
+            {"role": "system",
+             "content": "You are a professional social media marketer and branding expert specializing in Indian hospitality and festivals. Create engaging captions and catchy taglines that blend traditional values with modern appeal."},
+            {"role": "user", "content": user_prompt}
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.8,
+        "max_tokens": 200
+    }
+
+
+def _parse_combined(content: str) -> Dict[str, str]:
+    """Validate a combined reply into {"text", "tagline"}; raises ValueError."""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`").strip()
+        if content.startswith("json"):
+            content = content[len("json"):]
+    reply = json.loads(content, strict=False)
+    if not isinstance(reply, dict):
+        raise ValueError("reply is not a JSON object")
+    caption, tagline = reply.get("caption"), reply.get("tagline")
+    if not isinstance(caption, str) or not caption.strip():
+        raise ValueError("reply has no caption")
+    if not isinstance(tagline, str) or not tagline.strip():
+        raise ValueError("reply has no tagline")
+    tagline = tagline.strip().strip('"')
+    if len(tagline.split()) > TAGLINE_MAX_WORDS:
+        raise ValueError("tagline is too long")
+    return {"text": caption.strip(), "tagline": tagline}
+
+
+def _request_caption_and_tagline(prompt: str, hotel_name: str, occasion: str, audience: str) -> Dict[str, str]:
+    """One Groq call for caption and tagline, raising on any request failure.
+
+    Returns {"text", "tagline"}. A reply that fails validation is replaced by
+    the separate _request_caption and _request_tagline calls.
+    """
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    data = _combined_request_data(prompt, hotel_name, occasion, audience)
+
+    with metrics.track("caption_tagline") as sample:
+        cache_key = normalized_payload_key(data)
+        cached = llm_cache.get(cache_key)
+        sample["cache_hit"] = cached is not None
+        if cached is not None:
+            sample["payload_bytes"] = len(cached.encode("utf-8"))
+            return _parse_combined(cached)
+
+        estimated = _estimate_tokens(data)
+        response = _limited_post("groq", GROQ_CHAT_URL, estimated, headers=headers, json=data)
+        response.raise_for_status()
+        sample["payload_bytes"] = len(response.content)
+        body = response.json()
+        _record_token_usage("groq", estimated, body)
+        try:
+            result = _parse_combined(body["choices"][0]["message"]["content"])
+        except (KeyError, IndexError, TypeError, ValueError):
+            sample["error"] = True
+            result = None
+        else:
+            llm_cache.put(cache_key, json.dumps({"tagline": result["tagline"], "caption": result["text"]}))
+
+    if result is None:
+        result = {"text": _request_caption(prompt), "tagline": _request_tagline(hotel_name, occasion, audience)}
+    return result
+
+
+def _partial_json_string(buffer: str, start: int) -> Tuple[str, int, bool]:
+    """Decode a JSON string body from buffer[start:] as far as it has arrived.
+
+    Returns the decoded text, the index after what was consumed and whether
+    the closing quote was reached. Incomplete escapes are left for later.
+    """
+    i = start
+    while i < len(buffer):
+        char = buffer[i]
+        if char == "\\":
+            width = 2
+            if buffer[i + 1:i + 2] == "u":
+                width = 6
+                # A high surrogate is only decodable together with its pair
+                if buffer[i + 2:i + 4].lower() in ("d8", "d9", "da", "db"):
+                    width = 12
+            if i + width > len(buffer):
+                break
+            i += width
+        elif char == '"':
+            return json.loads(f'"{buffer[start:i]}"', strict=False), i + 1, True
+        else:
+            i += 1
+    return json.loads(f'"{buffer[start:i]}"', strict=False), i, False
+
+
+def _stream_caption_and_tagline(prompt: str, tagline_context: Tuple[str, str, str], stats: Dict) -> Iterator[str]:
+    """Yield caption tokens from a streamed combined reply, raising on failure.
+
+    The caption is decoded out of the JSON as it arrives. stats receives
+    "tagline" and, as for _stream_caption, "mode", "ttft" and "total". If
+    the reply does not validate, the parts it is missing come from the
+    separate caption and tagline calls.
+    """
+    start = time.perf_counter()
+    data = _combined_request_data(prompt, *tagline_context)
+    cache_key = normalized_payload_key(data)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        result = _parse_combined(cached)
+        stats.update(mode="cache", tagline=result["tagline"], ttft=time.perf_counter() - start,
+                     total=time.perf_counter() - start)
+        metrics.observe("caption_tagline", stats["total"], payload_bytes=len(cached.encode("utf-8")), cache_hit=True)
+        yield result["text"]
+        return
+
+    # Groq's JSON mode cannot stream, so the streamed request relies on the prompt
+    streamed = {key: value for key, value in data.items() if key != "response_format"}
+    response = _open_chat_stream(streamed)
+    if response is None:
+        result = _request_caption_and_tagline(prompt, *tagline_context)
+        stats.update(mode="fallback", tagline=result["tagline"], ttft=time.perf_counter() - start,
+                     total=time.perf_counter() - start)
+        yield result["text"]
+        return
+
+    buffer, position, finished, produced = "", None, False, False
+    try:
+        for token in _iter_stream_tokens(response):
+            buffer += token
+            if finished:
+                continue
+            if position is None:
+                match = _CAPTION_FIELD.search(buffer)
+                if match is None:
+                    continue
+                position = match.end()
+            text, position, finished = _partial_json_string(buffer, position)
+            if not produced:
+                text = text.lstrip()
+            if text:
+                if not produced:
+                    stats.update(mode="stream", ttft=time.perf_counter() - start)
+                produced = True
+                yield text
+    except Exception:
+        metrics.observe("caption_tagline", time.perf_counter() - start, error=True, cache_hit=False)
+        raise
+
+    try:
+        result = _parse_combined(buffer)
+    except ValueError:
+        metrics.observe("caption_tagline", time.perf_counter() - start, error=True,
+                        payload_bytes=len(buffer.encode("utf-8")), cache_hit=False)
+        if not produced:
+            yield from _stream_caption(prompt, stats)
+        stats["tagline"] = _request_tagline(*tagline_context)
+        stats["total"] = time.perf_counter() - start
+        return
+
+    stats.update(tagline=result["tagline"], total=time.perf_counter() - start)
+    metrics.observe("caption_tagline", stats["total"], payload_bytes=len(buffer.encode("utf-8")), cache_hit=False)
+    llm_cache.put(cache_key, json.dumps({"tagline": result["tagline"], "caption": result["text"]}))
+    if not produced:
+        # The caption was not where the stream decoder looked for it
+        stats.update(mode="stream", ttft=stats["total"])
+        yield result["text"]
+
+
+def stream_caption_and_tagline(prompt: str, tagline_context: Tuple[str, str, str],
+                               stats: Optional[Dict] = None) -> Iterator[str]:
+    """Stream a caption for st.write_stream, generating the tagline in the same request.
+
+    The tagline is left in stats["tagline"] once the stream is exhausted.
+    """
+    stats = stats if stats is not None else {}
+    if not GROQ_API_KEY:
+        stats["tagline"] = "Please set your GROQ API key in the app settings."
+        yield "Please set your GROQ API key in the app settings."
+        return
+
+    produced = False
+    try:
+        for token in _stream_caption_and_tagline(prompt, tagline_context, stats):
+            if token:
+                produced = True
+                yield token
+    except Exception as e:
+        st.error(f"Error generating text: {str(e)}")
+        stats.setdefault("tagline", GENERATION_FALLBACKS["tagline"])
+    if not produced:
+        # st.write_stream returns a list, not a str, when nothing was written
+        yield GENERATION_FALLBACKS["text"]
+
+
+# On-disk cache for Stability images, keyed by a hash of the full payload
+IMAGE_CACHE_DIR = get_secret("IMAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "stability"))
+IMAGE_CACHE_MAX_MB = int(get_secret("IMAGE_CACHE_MAX_MB", 500))
+
+image_cache = DiskImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB * 1024 * 1024)
+
+# Fetch single images as raw PNG instead of base64 inside JSON
+STABILITY_BINARY = str(get_secret("STABILITY_BINARY", "true")).lower() in ("1", "true", "yes")
+STABILITY_CHUNK_SIZE = 64 * 1024
+STABILITY_TEXT_TO_IMAGE_URL = f"{STABILITY_BASE_URL.rstrip('/')}/v1/generation/stable-diffusion-v1-6/text-to-image"
+
+
+class StabilityAuthError(Exception):
+    """Raised when Stability AI rejects the configured API key."""
+
+
+class StabilityResponseError(Exception):
+    """Raised when a Stability AI reply holds no images."""
+
+
+def _stability_payload(prompt: str, samples: int = 1, seed: int = 0) -> Dict:
+    # Enhance the prompt for better image generation
+    enhanced_prompt = f"""
+    Professional hotel photography, {prompt}
+    High quality, 4K resolution, perfect lighting, architectural details, inviting atmosphere
+    No text or watermarks, suitable for social media
+    """
+
+    return {
+        "text_prompts": [
+            {"text": enhanced_prompt},
+            {"text": "blurry, low quality, distorted, text, watermark, signature", "weight": -1}
+        ],
+        "cfg_scale": 7,
+        "height": 1024,
+        "width": 1024,
+        "samples": samples,
+        "steps": 30,
+        "seed": seed,
+    }
+
+
+def _request_images(prompt: str, samples: int = 1, seed: int = 0, use_cache: bool = True) -> List[Image.Image]:
+    """Call Stability AI for one or more background images, raising on any failure.
+
+    Identical payloads (prompt, cfg_scale, steps, size, samples and seed) are
+    served from the on-disk image cache. With use_cache=False the cache is
+    not read, but the fresh images still replace the cached ones.
+
+    Single images are fetched as raw PNG (STABILITY_BINARY) and streamed in
+    chunks straight into the image cache, then opened lazily from there, so
+    neither a base64 string nor a second in-memory copy is ever held. The
+    binary endpoint returns one image per request, so multi-sample requests
+    use the JSON response and decode one artifact at a time.
+    """
+    # Updated Stability AI API endpoint
+    url = STABILITY_TEXT_TO_IMAGE_URL
+    payload = _stability_payload(prompt, samples, seed)
+    cache_keys = [payload_key(url, payload, index) for index in range(samples)]
+
+    with metrics.track("image") as sample:
+        return _fetch_images(url, payload, cache_keys, use_cache, sample)
+
+
+def _fetch_images(url: str, payload: Dict, cache_keys: List[str], use_cache: bool, sample: Dict) -> List[Image.Image]:
+    """Cache lookup and Stability request for _request_images, filling the metrics sample."""
+    samples = payload["samples"]
+    sample["cache_hit"] = False
+    if use_cache:
+        cached = [image_cache.get(key) for key in cache_keys]
+        if all(data is not None for data in cached):
+            sample.update(cache_hit=True, payload_bytes=sum(len(data) for data in cached))
+            return [Image.open(io.BytesIO(data)) for data in cached]
+
+    binary = STABILITY_BINARY and samples == 1
+    headers = {
+        "Authorization": f"Bearer {STABILITY_API_KEY}",
+        "Content-Type": "application/json",
+        "Accept": "image/png" if binary else "application/json"
+    }
+
+    response = _limited_post("stability", url, headers=headers, json=payload, stream=binary)
+    with response:
         if response.status_code == 401:
-            st.error("Invalid Stability API key. Please check your API key in the settings.")
-            return None
-            
+            raise StabilityAuthError("Invalid Stability API key. Please check your API key in the settings.")
+
         response.raise_for_status()
 
-        data = response.json()
-        image_data = base64.b64decode(data["artifacts"][0]["base64"])
-        image = Image.open(io.BytesIO(image_data))
-        return image
+        if binary and response.headers.get("Finish-Reason", "SUCCESS") != "SUCCESS":
+            # Filtered or failed: shown once but never cached, so a retry can replace it
+            sample["payload_bytes"] = len(response.content)
+            return [Image.open(io.BytesIO(response.content))]
+        if binary:
+            chunks = response.iter_content(chunk_size=STABILITY_CHUNK_SIZE)
+            path = image_cache.put_stream(cache_keys[0], chunks)
+            sample["payload_bytes"] = os.path.getsize(path)
+            return [Image.open(path)]
+
+        sample["payload_bytes"] = len(response.content)
+        artifacts = response.json().get("artifacts") or []
+
+    if not artifacts:
+        raise StabilityResponseError("Stability AI returned no images. Please try again.")
+    images = []
+    for key, artifact in zip(cache_keys, artifacts):
+        image_data = base64.b64decode(artifact.pop("base64"))
+        # Filtered or failed samples are shown but never cached
+        if artifact.get("finishReason", "SUCCESS") == "SUCCESS":
+            image_cache.put(key, image_data)
+        images.append(Image.open(io.BytesIO(image_data)))
+    return images
+
 
+def _request_image(prompt: str, seed: int = 0, use_cache: bool = True) -> Image.Image:
+    """Call Stability AI for a single background image, raising on any failure."""
+    return _request_images(prompt, samples=1, seed=seed, use_cache=use_cache)[0]
+
+
+def generate_image_with_stability(prompt: str, seed: int = 0, use_cache: bool = True) -> Optional[Image.Image]:
+    if not STABILITY_API_KEY:
+        st.warning("Please set your Stability API key in the app settings.")
+        return None
+
+    try:
+        return _request_image(prompt, seed=seed, use_cache=use_cache)
+
+    except StabilityAuthError as e:
+        st.error(str(e))
+        return None
     except requests.exceptions.RequestException as e:
         st.error(f"Error connecting to Stability AI: {str(e)}")
         return None
@@ -165,51 +970,320 @@ def generate_image_with_stability(prompt: str) -> Optional[Image.Image]:
         return None
 
 
-def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_large_size=50):
-    """Apply the selected layout to the image with text and logo."""
-    draw = ImageDraw.Draw(image)
-    width, height = image.size
-    
-    # Load fonts
+def generate_image_variants(prompt: str, count: int, use_cache: bool = True) -> List[Image.Image]:
+    """Up to ``count`` candidate images from one Stability request ([] on failure)."""
+    if not STABILITY_API_KEY:
+        st.warning("Please set your Stability API key in the app settings.")
+        return []
+
     try:
-        font_large = ImageFont.truetype(font_name, font_large_size)
-    except:
-        font_large = ImageFont.load_default()
+        images = _request_images(prompt, samples=count, use_cache=use_cache)
+        if len(images) < count:
+            st.warning(f"Stability AI returned {len(images)} of {count} requested images.")
+        return images
 
-    # Function to wrap text into multiple lines
-    def wrap_text(text, font, max_width):
-        words = text.split()
-        lines = []
-        current_line = []
-        current_width = 0
-        
-        for word in words:
-            word_width = draw.textbbox((0, 0), word + " ", font=font)[2]
-            if current_width + word_width <= max_width:
-                current_line.append(word)
-                current_width += word_width
+    except StabilityAuthError as e:
+        st.error(str(e))
+        return []
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error connecting to Stability AI: {str(e)}")
+        return []
+    except Exception as e:
+        st.error(f"Error generating image: {str(e)}")
+        return []
+
+
+def _thumbnail(image: Image.Image, size: int) -> Image.Image:
+    thumbnail = image.convert("RGB")
+    thumbnail.thumbnail((size, size), Image.LANCZOS)
+    return thumbnail
+
+
+def variant_thumbnails(images: List[Image.Image], size: int = VARIANT_THUMBNAIL_SIZE) -> List[Image.Image]:
+    """Decode and shrink candidate images in parallel for the picker grid."""
+    return list(_render_executor.map(_thumbnail, images, [size] * len(images)))
+
+
+def _describe_generation_error(field: str, error: Exception) -> str:
+    """Turn a worker exception into the message the UI shows for that field."""
+    if isinstance(error, (StabilityAuthError, StabilityResponseError, RateLimitError)):
+        return str(error)
+    if field == "image" and isinstance(error, requests.exceptions.RequestException):
+        return f"Error connecting to Stability AI: {str(error)}"
+    return f"Error generating {field}: {str(error)}"
+
+
+# Shared pool for the generation orchestrator. It lives at module level so
+# every Streamlit session and rerun reuses the same worker threads.
+GENERATION_WORKERS = 6
+_generation_executor = ThreadPoolExecutor(max_workers=GENERATION_WORKERS,
+                                          thread_name_prefix="bookingjini-gen")
+
+GENERATION_FALLBACKS = {
+    "text": "Error generating text. Please try again.",
+    "image": None,
+    "tagline": "Error generating tagline. Please try again.",
+}
+
+
+def start_post_content(text_prompt: Optional[str] = None,
+                       image_prompt: Optional[str] = None,
+                       tagline_context: Optional[Tuple[str, str, str]] = None,
+                       variants: int = 1, client: Optional[str] = None) -> Dict:
+    """Submit caption, image and tagline generation to the shared pool.
+
+    Returns a pending handle for finish_post_content, so the caller can do
+    other work (such as streaming a caption) while the requests run. With
+    variants > 1, one request each asks for that many images and taglines.
+    client names the rate-limit queue the requests wait in; it defaults to
+    the caller's Streamlit session (or thread).
+    """
+    variants = max(1, min(variants, MAX_VARIANTS))
+    jobs = {}
+    result = {}
+    errors = {}
+    groq_missing = "Please set your GROQ API key in the app settings."
+
+    if (text_prompt is not None and tagline_context is not None and GROQ_API_KEY and CAPTION_TAGLINE_COMBINED
+            and variants == 1):
+        # One request answers both; finish_post_content splits the result
+        jobs["text+tagline"] = (_request_caption_and_tagline, (text_prompt, *tagline_context))
+        text_prompt = tagline_context = None
+    if text_prompt is not None:
+        if GROQ_API_KEY:
+            jobs["text"] = (_request_caption, (text_prompt,))
+        else:
+            result["text"] = errors["text"] = groq_missing
+    if image_prompt is not None:
+        if STABILITY_API_KEY and variants > 1:
+            jobs["image_variants"] = (_request_images, (image_prompt, variants))
+        elif STABILITY_API_KEY:
+            jobs["image"] = (_request_image, (image_prompt,))
+        else:
+            result["image"] = None
+            errors["image"] = "Please set your Stability API key in the app settings."
+    if tagline_context is not None:
+        if GROQ_API_KEY and variants > 1:
+            jobs["tagline_variants"] = (_request_tagline_variants, (*tagline_context, variants))
+        elif GROQ_API_KEY:
+            jobs["tagline"] = (_request_tagline, tuple(tagline_context))
+        else:
+            result["tagline"] = errors["tagline"] = groq_missing
+
+    client = client or _rate_limit_client()
+    timings = {}
+    return {
+        "start": time.perf_counter(),
+        "futures": {field: _generation_executor.submit(_timed_job, timings, field, client, func, *args)
+                    for field, (func, args) in jobs.items()},
+        "result": result,
+        "errors": errors,
+        "timings": timings,
+        "variants": variants,
+    }
+
+
+def finish_post_content(pending: Dict) -> Dict:
+    """Wait for the jobs from start_post_content and combine their results."""
+    result = pending["result"]
+    errors = pending["errors"]
+    for job, future in pending["futures"].items():
+        fields = job.split("+")
+        try:
+            value = future.result()
+            if job.endswith("_variants"):
+                # The first variant stands in for the single-value field
+                field = job[:-len("_variants")]
+                result.update({job: value, field: value[0]})
+                if len(value) < pending["variants"]:
+                    errors[field] = f"Only {len(value)} of {pending['variants']} {field} candidates were generated."
             else:
-                if current_line:
-                    lines.append(" ".join(current_line))
-                current_line = [word]
-                current_width = word_width
-        
-        if current_line:
-            lines.append(" ".join(current_line))
-        return lines
+                result.update(value if len(fields) > 1 else {job: value})
+        except Exception as e:
+            for field in fields:
+                field = field[:-len("_variants")] if field.endswith("_variants") else field
+                errors[field] = _describe_generation_error(field, e)
+                result[field] = GENERATION_FALLBACKS[field]
 
-    # Calculate maximum width for text
-    max_width = width - 100  # Leave 50px margin on each side
-    
-    # Wrap text into multiple lines
-    lines = wrap_text(text, font_large, max_width)
-    
-    # Calculate total height needed for all lines
-    line_height = font_large_size + 30  # Increased line spacing
-    total_height = len(lines) * line_height
-    
-    # Create a semi-transparent overlay for better text visibility
-    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    result["errors"] = errors
+    result["timings"] = dict(pending["timings"])
+    result["elapsed"] = time.perf_counter() - pending["start"]
+    return result
+
+
+def generate_post_content(text_prompt: Optional[str] = None,
+                          image_prompt: Optional[str] = None,
+                          tagline_context: Optional[Tuple[str, str, str]] = None,
+                          variants: int = 1, client: Optional[str] = None) -> Dict:
+    """Generate caption, image and tagline concurrently.
+
+    Any of the three inputs may be None to skip that field. The calls are
+    submitted together to a shared thread pool, so the wall-clock time is
+    roughly that of the slowest request rather than their sum. With
+    CAPTION_TAGLINE_COMBINED, caption and tagline share one Groq request.
+
+    Returns a dict with "text", "image" and "tagline" for the requested
+    fields (plus "image_variants" and "tagline_variants" lists when
+    variants > 1), "errors" mapping each failed field to a user-facing message and
+    "elapsed" holding the wall-clock seconds spent. Failed fields carry the
+    same fallback values the individual generate_* functions return.
+    Nothing is written to the Streamlit page from the worker threads; the
+    caller decides how to surface errors. client is as in start_post_content.
+    """
+    return finish_post_content(start_post_content(text_prompt, image_prompt, tagline_context, variants, client))
+
+
+# Layouts with descriptions
+LAYOUTS = {
+    "Festive Diya": "Traditional diya pattern with warm glow effect",
+    "Festive Rangoli": "Colorful rangoli-inspired design with transparent overlay",
+    "Festive Toran": "Traditional toran design with decorative elements",
+    "Festive Mandala": "Intricate mandala pattern with transparent background",
+    "Festive Ganesha": "Elegant Ganesha pattern with divine aura",
+    "Festive Om": "Sacred Om symbol with spiritual elements",
+    "Festive Swastika": "Traditional swastika pattern with auspicious design",
+    "Festive Lotus": "Beautiful lotus pattern with blooming effect",
+    "Festive Peacock": "Majestic peacock design with colorful feathers",
+    "Festive Border": "Ornate border pattern with traditional motifs"
+}
+
+# Gap between the bottom of the text block and the bottom of the image
+LAYOUT_TEXT_MARGINS = {
+    "Festive Diya": 100,
+    "Festive Rangoli": 50,
+    "Festive Toran": 50,
+    "Festive Ganesha": 100,
+    "Festive Om": 100,
+    "Festive Swastika": 100,
+    "Festive Lotus": 100,
+    "Festive Peacock": 100,
+    "Festive Border": 50,
+    "Festive Mandala": 50,
+}
+
+# Ready-to-composite decoration patches keyed by (layout, width, height,
+# preview size): the overlay cut into tiles, each cropped to what its
+# decorations cover
+LAYOUT_PATCH_TILE = 256
+LAYOUT_OVERLAY_CACHE_SIZE = int(get_secret("LAYOUT_OVERLAY_CACHE_SIZE", 32))
+_overlay_cache = OrderedDict()
+_overlay_cache_lock = threading.Lock()
+
+
+def _layout_key(layout_style: str) -> str:
+    # Unknown layout names fall through to the mandala pattern
+    return layout_style if layout_style in LAYOUT_TEXT_MARGINS else "Festive Mandala"
+
+
+def layout_text_y(layout_style: str, height: int, total_height: int) -> int:
+    """Top of the text block for a layout, given the wrapped text height."""
+    return height - total_height - LAYOUT_TEXT_MARGINS[_layout_key(layout_style)]
+
+
+RANGOLI_PATTERN_SIZE = 40
+
+
+def _draw_rangoli_cell(overlay_draw, center_x, center_y, pattern_size=RANGOLI_PATTERN_SIZE,
+                       line_fill=(255, 255, 255, 50), dot_fill=(255, 255, 255, 100)):
+    """Draw one rangoli flower (eight petals and a centre dot)."""
+    # Draw petals
+    for angle in range(0, 360, 45):
+        rad = math.radians(angle)
+        x1 = center_x + pattern_size // 3 * math.cos(rad)
+        y1 = center_y + pattern_size // 3 * math.sin(rad)
+        x2 = center_x + pattern_size // 2 * math.cos(rad)
+        y2 = center_y + pattern_size // 2 * math.sin(rad)
+        overlay_draw.line([(x1, y1), (x2, y2)], fill=line_fill, width=2)
+
+    # Draw center dot
+    overlay_draw.ellipse([(center_x - 3, center_y - 3),
+                        (center_x + 3, center_y + 3)],
+                       fill=dot_fill)
+
+
+def _rangoli_cell_runs(length: int, pattern_size: int) -> List[list]:
+    """Group the cells along one axis into runs that rasterise identically.
+
+    The petal end points are floats, and their rounding depends on how far
+    the cell is from the origin, so a flower near x=20 and one near x=2000
+    can differ by a pixel. Two cells draw the same pixels (shifted) exactly
+    when the float offsets of their vertices from the centre are equal,
+    which is what the signature captures. Returns [signature, first cell,
+    cell count] runs in order.
+    """
+    runs = []
+    for index, origin in enumerate(range(0, length, pattern_size)):
+        center = origin + pattern_size // 2
+        signature = tuple((center + pattern_size // radius * trig(math.radians(angle))) - center
+                          for angle in range(0, 360, 45)
+                          for radius in (3, 2)
+                          for trig in (math.cos, math.sin))
+        if runs and runs[-1][0] == signature:
+            runs[-1][2] += 1
+        else:
+            runs.append([signature, index, 1])
+    return runs
+
+
+def _render_rangoli_overlay(width: int, height: int, pattern_size: int = RANGOLI_PATTERN_SIZE) -> Image.Image:
+    """Render the rangoli grid by stamping a few rasterised cells with NumPy.
+
+    Only one flower per distinct (column signature, row signature) pair is
+    drawn, at its real position so the float rounding is the same as in a
+    cell-by-cell render. Each of those is cut out with a half-cell margin
+    (petals spill a pixel past their cell) and tiled over every cell of its
+    runs, combining tiles with a per-pixel maximum. All petals share one
+    colour and only ever overlap other petals, so this is pixel-identical
+    to drawing all ~W*H/1600 cells one by one while issuing a few dozen
+    draw calls instead of thousands.
+    """
+    import numpy as np
+
+    p = pattern_size
+    margin = p // 2
+    col_runs = _rangoli_cell_runs(width, p)
+    row_runs = _rangoli_cell_runs(height, p)
+
+    # Rasterise one representative flower per signature pair. The sampler
+    # is one cell larger than the canvas so a representative on the right
+    # or bottom edge keeps the pixels it spills past the edge.
+    sampler = Image.new('L', (width + p, height + p), 0)
+    sampler_draw = ImageDraw.Draw(sampler)
+    stamps = {}
+    for col_sig, col_index, _ in col_runs:
+        for row_sig, row_index, _ in row_runs:
+            if (col_sig, row_sig) in stamps:
+                continue
+            x, y = col_index * p, row_index * p
+            _draw_rangoli_cell(sampler_draw, x + p // 2, y + p // 2, p, line_fill=50, dot_fill=100)
+            box = (x - margin, y - margin, x - margin + 2 * p, y - margin + 2 * p)
+            stamps[(col_sig, row_sig)] = np.asarray(sampler.crop(box))
+            sampler.paste(0, box)
+
+    # Tile each stamp over its block of cells; combined[margin:, margin:]
+    # lines up with the canvas origin
+    cols = -(-width // p)
+    rows = -(-height // p)
+    combined = np.zeros(((rows + 1) * p, (cols + 1) * p), dtype=np.uint8)
+    for col_sig, col_index, col_count in col_runs:
+        for row_sig, row_index, row_count in row_runs:
+            stamp = stamps[(col_sig, row_sig)]
+            for dy in (0, 1):
+                for dx in (0, 1):
+                    quadrant = stamp[dy * p:(dy + 1) * p, dx * p:(dx + 1) * p]
+                    top = (row_index + dy) * p
+                    left = (col_index + dx) * p
+                    region = combined[top:top + row_count * p, left:left + col_count * p]
+                    np.maximum(region, np.tile(quadrant, (row_count, col_count)), out=region)
+
+    alpha = Image.fromarray(np.ascontiguousarray(combined[margin:margin + height, margin:margin + width]), 'L')
+    white = alpha.point(lambda value: 255 if value else 0)
+    return Image.merge('RGBA', (white, white, white, alpha))
+
+
+def _draw_layout_overlay(overlay, layout_style):
+    """Draw the decorations for layout_style onto a blank RGBA overlay."""
+    width, height = overlay.size
     overlay_draw = ImageDraw.Draw(overlay)
     
     # Apply layout-specific effects
@@ -243,33 +1317,10 @@ def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_l
             (center_x + 20, diya_y - 60)
         ]
         overlay_draw.polygon(flame_points, fill=(255, 150, 0, 150))
-        
-        text_y = height - total_height - 100
     
     elif layout_style == "Festive Rangoli":
-        # Create rangoli-inspired pattern
-        pattern_size = 40
-        for i in range(0, width, pattern_size):
-            for j in range(0, height, pattern_size):
-                # Draw flower pattern
-                center_x = i + pattern_size // 2
-                center_y = j + pattern_size // 2
-                
-                # Draw petals
-                for angle in range(0, 360, 45):
-                    rad = math.radians(angle)
-                    x1 = center_x + pattern_size // 3 * math.cos(rad)
-                    y1 = center_y + pattern_size // 3 * math.sin(rad)
-                    x2 = center_x + pattern_size // 2 * math.cos(rad)
-                    y2 = center_y + pattern_size // 2 * math.sin(rad)
-                    overlay_draw.line([(x1, y1), (x2, y2)], fill=(255, 255, 255, 50), width=2)
-                
-                # Draw center dot
-                overlay_draw.ellipse([(center_x - 3, center_y - 3),
-                                    (center_x + 3, center_y + 3)],
-                                   fill=(255, 255, 255, 100))
-        
-        text_y = height - total_height - 50
+        # Create rangoli-inspired pattern, stamped from a single cell
+        overlay.paste(_render_rangoli_overlay(width, height))
     
     elif layout_style == "Festive Toran":
         # Create toran-inspired design
@@ -293,8 +1344,6 @@ def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_l
             overlay_draw.line([(bell_x, toran_height),
                              (bell_x, bell_y)],
                             fill=(255, 255, 255, 100), width=2)
-        
-        text_y = height - total_height - 50
     
     elif layout_style == "Festive Ganesha":
         # Create Ganesha-inspired pattern
@@ -323,8 +1372,6 @@ def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_l
         overlay_draw.ellipse([(center_x + 40, center_y - 40),
                             (center_x + 80, center_y)],
                            fill=(255, 255, 255, 100))
-        
-        text_y = height - total_height - 100
     
     elif layout_style == "Festive Om":
         # Create Om symbol pattern
@@ -347,8 +1394,6 @@ def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_l
         overlay_draw.ellipse([(center_x - 5, center_y - 5),
                             (center_x + 5, center_y + 5)],
                            fill=(255, 255, 255, 200))
-        
-        text_y = height - total_height - 100
     
     elif layout_style == "Festive Swastika":
         # Create swastika pattern
@@ -376,8 +1421,6 @@ def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_l
                 overlay_draw.ellipse([(center_x + dx*arm_length - dot_radius, center_y + dy*arm_length - dot_radius),
                                     (center_x + dx*arm_length + dot_radius, center_y + dy*arm_length + dot_radius)],
                                    fill=(255, 255, 255, 200))
-        
-        text_y = height - total_height - 100
     
     elif layout_style == "Festive Lotus":
         # Create lotus pattern
@@ -403,8 +1446,6 @@ def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_l
         overlay_draw.ellipse([(center_x - 20, center_y - 20),
                             (center_x + 20, center_y + 20)],
                            fill=(255, 255, 255, 200))
-        
-        text_y = height - total_height - 100
     
     elif layout_style == "Festive Peacock":
         # Create peacock pattern
@@ -437,8 +1478,6 @@ def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_l
         overlay_draw.ellipse([(center_x + body_radius - head_radius, center_y - head_radius),
                             (center_x + body_radius + head_radius, center_y + head_radius)],
                            fill=(255, 255, 255, 150))
-        
-        text_y = height - total_height - 100
     
     elif layout_style == "Festive Border":
         # Create ornate border pattern
@@ -486,8 +1525,6 @@ def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_l
             overlay_draw.ellipse([(i - 5, height - border_width - 5),
                                 (i + 5, height - border_width + 5)],
                                fill=(255, 255, 255, 150))
-        
-        text_y = height - total_height - 50
     
     else:  # Festive Mandala
         # Create mandala pattern
@@ -510,43 +1547,712 @@ def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_l
             overlay_draw.ellipse([(x - 10, y - 10),
                                 (x + 10, y + 10)],
                                fill=(255, 255, 255, 150))
+
+
+def _overlay_patches(overlay: Image.Image, tile: int = LAYOUT_PATCH_TILE) -> List[Tuple[Tuple[int, int, int, int],
+                                                                                       Image.Image, Image.Image]]:
+    """Non-transparent parts of overlay as (box, colour, alpha) patches.
+
+    The canvas is cut into tiles and each tile is trimmed to the bounding
+    box of its visible pixels, so a border or a small emblem becomes a few
+    thin patches instead of a full-frame layer. Fully covered rows of tiles
+    are merged back into one patch.
+    """
+    width, height = overlay.size
+    patches = []
+    for top in range(0, height, tile):
+        bottom = min(height, top + tile)
+        row = overlay.crop((0, top, width, bottom))
+        row_box = row.getbbox()
+        if row_box is None:
+            continue
+        boxes = []
+        for left in range(row_box[0], row_box[2], tile):
+            cell = row.crop((left, 0, min(row_box[2], left + tile), bottom - top))
+            box = cell.getbbox()
+            if box is not None:
+                boxes.append((left + box[0], top + box[1], left + box[2], top + box[3]))
+        # Merging beats many small blends once most of the row is dirty
+        if sum((r - l) * (b - t) for l, t, r, b in boxes) > (row_box[2] - row_box[0]) * (row_box[3] - row_box[1]) // 2:
+            boxes = [(row_box[0], top + row_box[1], row_box[2], top + row_box[3])]
+        for box in boxes:
+            patch = overlay.crop(box)
+            patches.append((box, patch.convert('RGB'), patch.getchannel('A')))
+    return patches
+
+
+def get_layout_overlay(layout_style: str, width: int, height: int,
+                       size: Optional[Tuple[int, int]] = None) -> List[Tuple[Tuple[int, int, int, int],
+                                                                             Image.Image, Image.Image]]:
+    """Return the cached decoration patches for a layout and canvas size.
+
+    Each entry is (box, colour, alpha): a region of the canvas and the
+    overlay's RGB and alpha there. Everything outside the boxes is
+    transparent. With size, the decorations are drawn for the width x height
+    canvas and shrunk to size, for previews that must match the export.
+    The patches are shared between renders and must not be modified.
+    """
+    size = size if size is not None and size != (width, height) else None
+    key = (_layout_key(layout_style), width, height, size)
+    with _overlay_cache_lock:
+        patches = _overlay_cache.get(key)
+        if patches is not None:
+            _overlay_cache.move_to_end(key)
+            return patches
+
+    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    _draw_layout_overlay(overlay, key[0])
+    if size is not None:
+        # Premultiplied, so transparent pixels don't bleed black into the edges
+        overlay = overlay.convert('RGBa').resize(size, Image.LANCZOS).convert('RGBA')
+    patches = _overlay_patches(overlay)
+
+    with _overlay_cache_lock:
+        _overlay_cache[key] = patches
+        while len(_overlay_cache) > LAYOUT_OVERLAY_CACHE_SIZE:
+            _overlay_cache.popitem(last=False)
+    return patches
+
+
+def _composite_patch(image: Image.Image, box: Tuple[int, int, int, int], colour: Image.Image, alpha: Image.Image):
+    """Alpha-blend a patch onto image at box, in place, touching only that region."""
+    if image.mode == 'RGBA':
+        image.alpha_composite(Image.merge('RGBA', (*colour.split(), alpha)), dest=box[:2])
+        return
+    # Over an opaque background, a masked paste is the same blend as
+    # alpha_composite, without converting anything to RGBA
+    image.paste(colour, box[:2], alpha)
+
+
+@metrics.timed("apply_layout")
+def apply_layout(image, text, layout_style, colors, font_name, logo=None, font_large_size=50, full_size=None):
+    """Apply the selected layout to the image with text and logo.
+
+    Returns a new image in the input's mode (RGB or RGBA; other modes become
+    RGB). Only the region the layout decorates is blended; text and logo
+    are drawn straight onto the copy.
+
+    full_size is for previews: image is a downscaled copy of a photo of that
+    size, and the design is laid out on the full-size canvas and drawn
+    scaled, so it wraps and lines up exactly as the full render will.
+    """
+    width, height = image.size
+    full_width, full_height = full_size or (width, height)
+    scale = width / full_width
+
+    def scaled(value):
+        return round(value * scale)
+    
+    # Load fonts (resolved to a system font file and cached per size)
+    font_large = get_font(font_name, max(1, scaled(font_large_size)))
+
+    # Function to wrap text into multiple lines
+    def wrap_text(text, max_width):
+        words = text.split()
+        lines = []
+        current_line = []
+        current_width = 0
         
-        text_y = height - total_height - 50
+        for word in words:
+            word_width = text_width(font_name, font_large_size, word + " ")
+            if current_width + word_width <= max_width:
+                current_line.append(word)
+                current_width += word_width
+            else:
+                if current_line:
+                    lines.append(" ".join(current_line))
+                current_line = [word]
+                current_width = word_width
+        
+        if current_line:
+            lines.append(" ".join(current_line))
+        return lines
+
+    # Calculate maximum width for text
+    max_width = full_width - 100  # Leave 50px margin on each side
+    
+    # Wrap text into multiple lines
+    lines = wrap_text(text, max_width)
+    
+    # Calculate total height needed for all lines
+    line_height = font_large_size + 30  # Increased line spacing
+    total_height = len(lines) * line_height
+    
+    # Decorations depend only on the layout and canvas size, so the patch
+    # comes from a cache and only the text is drawn per render
+    patches = get_layout_overlay(layout_style, full_width, full_height, (width, height))
+    text_y = layout_text_y(layout_style, full_height, total_height)
     
-    # Merge the overlay with the original image
-    image = Image.alpha_composite(image.convert('RGBA'), overlay)
+    # Blend the decorations into a single working copy of the photo
+    image = image.copy() if image.mode in ('RGB', 'RGBA') else image.convert('RGB')
+    for box, colour, alpha in patches:
+        _composite_patch(image, box, colour, alpha)
     draw = ImageDraw.Draw(image)
     
     # Draw text with shadow for better visibility
-    shadow_offset = 2
+    shadow_offset = max(1, scaled(1))
     for i, line in enumerate(lines):
+        line_y = scaled(text_y + i * line_height)
         # Draw shadow
-        draw.text((51, text_y + i * line_height + 1), line, font=font_large, fill=(0, 0, 0, 128))
+        draw.text((scaled(50) + shadow_offset, line_y + shadow_offset), line, font=font_large, fill=(0, 0, 0, 128))
         # Draw main text
-        draw.text((50, text_y + i * line_height), line, font=font_large, fill=colors[0])
+        draw.text((scaled(50), line_y), line, font=font_large, fill=colors[0])
     
     # Add logo if provided
     if logo:
         logo_width = 100
         logo_height = int(logo_width * (logo.size[1] / logo.size[0]))
-        logo_x = width - logo_width - 20
+        logo_x = full_width - logo_width - 20
         logo_y = 20
-        image.paste(logo, (logo_x, logo_y), logo)
+        if scale != 1:
+            logo = logo.resize((max(1, scaled(logo.size[0])), max(1, scaled(logo.size[1]))), Image.LANCZOS)
+        image.paste(logo, (scaled(logo_x), scaled(logo_y)), logo)
 
     return image
 
-def post_to_social_media(platform: str, image_path: str, caption: str) -> bool:
+def encode_jpeg(image: Image.Image, **options) -> bytes:
+    """Encode a composite as JPEG bytes (RGBA is flattened to RGB first)."""
+    with metrics.track("jpeg_encode") as sample:
+        buffer = io.BytesIO()
+        (image if image.mode == 'RGB' else image.convert('RGB')).save(buffer, format="JPEG", **options)
+        sample["payload_bytes"] = buffer.tell()
+        return buffer.getvalue()
 
-    if not SOCIAL_MEDIA_CREDENTIALS.get(platform):
-        st.warning(f"Please set up your {platform.capitalize()} credentials in the app settings.")
-        return False
 
-    st.success(f"Post successfully shared to {platform.capitalize()}! (simulation)")
-    return True
+# Longest side of the Preview & Edit render; the full-resolution composite
+# is only made for export (0 previews at full size)
+PREVIEW_SIZE = int(get_secret("PREVIEW_SIZE", 384))
+PREVIEW_QUALITY = int(get_secret("PREVIEW_QUALITY", 80))
+
+
+def _preview_base(cache: Dict, image: Image.Image, preview_size: int) -> Image.Image:
+    """image shrunk to preview_size on its longest side, cached per image."""
+    scale = preview_size / max(image.size) if preview_size > 0 else 1
+    if scale >= 1:
+        return image
+    if cache.get("base_image") is not image or cache.get("base_size") != preview_size:
+        size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+        cache.update(base_image=image, base_size=preview_size, base=image.resize(size, Image.LANCZOS))
+    return cache["base"]
+
+
+def render_preview(cache: Dict, image, text, layout_style, colors, font_name, logo=None, font_large_size=50,
+                   preview_size=None) -> Tuple[bytes, bool]:
+    """Low-resolution JPEG of the design for the Preview & Edit tab.
+
+    The layout is applied to a copy of image shrunk to preview_size
+    (PREVIEW_SIZE by default) with the geometry scaled to match, so each
+    edit costs a fraction of a full render and sends a small file to the
+    browser. cache is a per-session dict (st.session_state.preview_cache)
+    holding the shrunk photo and the last render. The image and logo are
+    matched by identity, so callers must keep the same objects across
+    reruns while they are unchanged. Returns (jpeg_bytes, cached) where
+    cached tells whether the render was served from memory.
+    """
+    preview_size = PREVIEW_SIZE if preview_size is None else preview_size
+    key = (text, layout_style, tuple(colors), font_name, font_large_size, preview_size)
+    if cache.get("key") == key and cache.get("image") is image and cache.get("logo") is logo:
+        return cache["preview"], True
+
+    base = _preview_base(cache, image, preview_size)
+    composite = apply_layout(base, text, layout_style, colors, font_name, logo,
+                             font_large_size=font_large_size, full_size=image.size)
+    cache.update(key=key, image=image, logo=logo, preview=encode_jpeg(composite, quality=PREVIEW_QUALITY))
+    return cache["preview"], False
+
+
+def render_export(assets: "SessionAssets", image, text, layout_style, colors, font_name, logo=None,
+                  font_large_size=50, render=True) -> Optional[bytes]:
+    """Full-resolution JPEG of the design, kept in the session's assets as "post.jpg".
+
+    The stored post is reused until the design changes. With render=False
+    only the stored post is returned (None if the design changed since), so
+    the page can offer the download without compositing at full size on
+    every rerun.
+    """
+    key = (text, layout_style, tuple(colors), font_name, font_large_size)
+    data = assets.get("post.jpg", key, (image, logo))
+    if data is not None or not render:
+        return data
+
+    composite = apply_layout(image, text, layout_style, colors, font_name, logo,
+                             font_large_size=font_large_size)
+    data = encode_jpeg(composite)
+    assets.put("post.jpg", data, key, (image, logo))
+    return data
+
+
+# Export sizes per platform: Instagram portrait (4:5), Facebook and LinkedIn
+# link-share landscape (1.91:1) and Twitter 16:9
+PLATFORM_RENDITIONS = {
+    "instagram": (1080, 1350),
+    "facebook": (1200, 630),
+    "twitter": (1600, 900),
+    "linkedin": (1200, 627),
+}
+
+# CPU-bound rendering pool, separate from the network-bound generation pool
+RENDER_WORKERS = int(get_secret("RENDER_WORKERS", os.cpu_count() or 2))
+_render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="bookingjini-render")
+
+
+def smart_crop(image: Image.Image, width: int, height: int) -> Image.Image:
+    """Crop image to the width:height aspect ratio and resize it.
+
+    The crop window slides along the axis being trimmed and keeps the
+    position with the most edge detail, so the subject of the photo is
+    kept rather than always cutting around the centre.
+    """
+    src_w, src_h = image.size
+    target_ratio = width / height
+    if abs(src_w / src_h - target_ratio) < 0.01:
+        return image.resize((width, height), Image.LANCZOS)
+
+    if src_w / src_h > target_ratio:
+        crop_w, crop_h = round(src_h * target_ratio), src_h
+    else:
+        crop_w, crop_h = src_w, round(src_w / target_ratio)
+
+    # Score candidate windows on a small edge map
+    scale = 128 / max(src_w, src_h)
+    edges = image.convert('L').resize((max(1, round(src_w * scale)), max(1, round(src_h * scale)))).filter(ImageFilter.FIND_EDGES)
+    slack_x, slack_y = src_w - crop_w, src_h - crop_h
+    best_offset, best_score = 0, -1.0
+    steps = 16
+    for step in range(steps + 1):
+        offset = round((slack_x or slack_y) * step / steps)
+        left, top = (offset, 0) if slack_x else (0, offset)
+        box = (round(left * scale), round(top * scale),
+               max(round(left * scale) + 1, round((left + crop_w) * scale)),
+               max(round(top * scale) + 1, round((top + crop_h) * scale)))
+        score = sum(ImageStat.Stat(edges.crop(box)).sum)
+        # Prefer the centred window when scores tie
+        if score > best_score or (score == best_score and abs(step - steps / 2) < abs(best_offset - steps / 2)):
+            best_offset, best_score = step, score
+
+    offset = round((slack_x or slack_y) * best_offset / steps)
+    left, top = (offset, 0) if slack_x else (0, offset)
+    return image.crop((left, top, left + crop_w, top + crop_h)).resize((width, height), Image.LANCZOS)
+
+
+def render_rendition(image, size, text, layout_style, colors, font_name, logo=None,
+                     font_large_size=50) -> Image.Image:
+    """The design re-laid out at another size, smart-cropped to its aspect ratio."""
+    width, height = size
+    background = smart_crop(image, width, height)
+    # Scale the text with the shorter side so it wraps the same way
+    scaled_font_size = max(10, round(font_large_size * min(width, height) / min(image.size)))
+    return apply_layout(background, text, layout_style, colors, font_name, logo,
+                        font_large_size=scaled_font_size)
+
+
+def _render_rendition(image, size, text, layout_style, colors, font_name, logo, font_large_size) -> bytes:
+    return encode_jpeg(render_rendition(image, size, text, layout_style, colors, font_name, logo, font_large_size),
+                       quality=90)
+
+
+def render_renditions(assets: "SessionAssets", image, text, layout_style, colors, font_name, logo=None,
+                      font_large_size=50, platforms=None) -> Dict[str, bytes]:
+    """Per-platform JPEG exports of a design, rendered in parallel.
+
+    Each platform gets the background smart-cropped to its aspect ratio and
+    the layout reapplied at that size, so text and decorations are placed
+    for the new shape instead of being cropped away. The JPEGs are kept in
+    the session's assets as "post_<platform>.jpg", so previewing, publishing
+    and downloading reuse one encoding until the design changes.
+    """
+    platforms = list(platforms or PLATFORM_RENDITIONS)
+    key = (text, layout_style, tuple(colors), font_name, font_large_size)
+    renditions = {platform: assets.get(f"post_{platform}.jpg", key, (image, logo)) for platform in platforms}
+    futures = {
+        platform: _render_executor.submit(_render_rendition, image, PLATFORM_RENDITIONS[platform], text,
+                                          layout_style, colors, font_name, logo, font_large_size)
+        for platform, data in renditions.items() if data is None
+    }
+    for platform, future in futures.items():
+        renditions[platform] = future.result()
+        assets.put(f"post_{platform}.jpg", renditions[platform], key, (image, logo))
+    return renditions
+
+
+# Session output buffers. With ASSET_SPILL_TO_DISK set, each session's
+# assets are also written to a private temp directory (for uploaders that
+# need a file path); idle directories are removed after ASSET_SPILL_TTL.
+ASSET_SPILL_TO_DISK = str(get_secret("ASSET_SPILL_TO_DISK", "")).lower() in ("1", "true", "yes")
+ASSET_SPILL_TTL = float(get_secret("ASSET_SPILL_TTL", 3600))
+
+_spill_dirs = {}  # path -> last access time
+_spill_dirs_lock = threading.Lock()
+
+
+def _remove_spill_dir(path: str):
+    with _spill_dirs_lock:
+        _spill_dirs.pop(path, None)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def cleanup_expired_spill_dirs(ttl: float = ASSET_SPILL_TTL) -> int:
+    """Remove spill directories idle for longer than ttl seconds."""
+    cutoff = time.time() - ttl
+    with _spill_dirs_lock:
+        expired = [path for path, last_used in _spill_dirs.items() if last_used < cutoff]
+    for path in expired:
+        _remove_spill_dir(path)
+    return len(expired)
+
+
+class SessionAssets:
+    """Encoded output files (the final post image, ...) owned by one session.
+
+    Assets live in memory, so concurrent users never share a file and the
+    Publish tab needs no disk round trip. With spill enabled they are also
+    written to a per-session temp directory, which is removed when this
+    object is garbage collected with its session or when it expires.
+    """
+
+    def __init__(self, spill: bool = ASSET_SPILL_TO_DISK):
+        self._assets = {}
+        self._sources = {}
+        self._spill_dir = None
+        if spill:
+            cleanup_expired_spill_dirs()
+            self._spill_dir = tempfile.mkdtemp(prefix="bookingjini-session-")
+            with _spill_dirs_lock:
+                _spill_dirs[self._spill_dir] = time.time()
+            weakref.finalize(self, _remove_spill_dir, self._spill_dir)
+
+    def put(self, name: str, data: bytes, key=None, inputs: Tuple = ()):
+        """Store an asset, tagged with the design key and input objects it was made from."""
+        self._assets[name] = data
+        self._sources[name] = (key, inputs)
+        if self._spill_dir:
+            os.makedirs(self._spill_dir, exist_ok=True)
+            with open(os.path.join(self._spill_dir, name), "wb") as f:
+                f.write(data)
+            with _spill_dirs_lock:
+                _spill_dirs[self._spill_dir] = time.time()
+
+    def get(self, name: str, key=None, inputs: Tuple = ()) -> Optional[bytes]:
+        """The asset, or None if it was made from another design.
+
+        key is compared by value and inputs (the photo, the logo) by
+        identity, as in render_preview.
+        """
+        source = self._sources.get(name)
+        if source is None or source[0] != key or len(source[1]) != len(inputs) or \
+                any(old is not new for old, new in zip(source[1], inputs)):
+            return None
+        return self._assets[name]
+
+    def path(self, name: str) -> Optional[str]:
+        """On-disk copy of an asset, rewritten if it expired; None without spill."""
+        if not self._spill_dir or name not in self._assets:
+            return None
+        path = os.path.join(self._spill_dir, name)
+        if not os.path.exists(path):
+            self.put(name, self._assets[name])
+        return path
+
+
+# Publishing. With SOCIAL_API_BASE_URL set, posts are sent as
+# POST {SOCIAL_API_BASE_URL}/{platform}/posts (image + caption, bearer token);
+# without it publishing is simulated. mock_api.py serves a local stand-in.
+SOCIAL_API_BASE_URL = get_secret("SOCIAL_API_BASE_URL", "")
+PUBLISH_MAX_RETRIES = int(get_secret("PUBLISH_MAX_RETRIES", 3))
+PUBLISH_RETRY_DELAY = float(get_secret("PUBLISH_RETRY_DELAY", 1.0))
+PUBLISH_TIMEOUT = float(get_secret("PUBLISH_TIMEOUT", 30))
+PUBLISH_RATE_LIMITS = {
+    # Posts per minute, per platform
+    "instagram": float(get_secret("INSTAGRAM_RATE_PER_MINUTE", 10)),
+    "facebook": float(get_secret("FACEBOOK_RATE_PER_MINUTE", 30)),
+    "twitter": float(get_secret("TWITTER_RATE_PER_MINUTE", 50)),
+    "linkedin": float(get_secret("LINKEDIN_RATE_PER_MINUTE", 20)),
+}
+_publish_limiters = {platform: TokenBucket(rate, burst=max(1.0, rate / 10))
+                     for platform, rate in PUBLISH_RATE_LIMITS.items()}
+_publish_executor = ThreadPoolExecutor(max_workers=len(PUBLISH_RATE_LIMITS) * 2,
+                                       thread_name_prefix="bookingjini-publish")
+
+
+def publish_to_platform(platform: str, image_data: bytes, caption: str) -> Dict:
+    """Publish one post to one platform, with rate limiting and retries.
+
+    Safe to call from worker threads (no Streamlit calls). Returns a dict
+    with platform, ok, attempts, elapsed, post_id and error.
+    """
+    with metrics.track("publish") as sample:
+        result = _publish(platform, image_data, caption)
+        sample.update(payload_bytes=len(image_data), error=not result["ok"])
+    return result
+
+
+def _publish(platform: str, image_data: bytes, caption: str) -> Dict:
+    start = time.perf_counter()
+    result = {"platform": platform, "ok": False, "attempts": 0, "post_id": None, "error": None}
+    token = SOCIAL_MEDIA_CREDENTIALS.get(platform)
+    if not token:
+        result["error"] = f"Please set up your {platform.capitalize()} credentials in the app settings."
+    elif not SOCIAL_API_BASE_URL:
+        result.update(ok=True, attempts=1, post_id="simulated")
+    else:
+        limiter = _publish_limiters.get(platform)
+        url = f"{SOCIAL_API_BASE_URL.rstrip('/')}/{platform}/posts"
+        for attempt in range(1, PUBLISH_MAX_RETRIES + 2):
+            result["attempts"] = attempt
+            if limiter is not None:
+                limiter.acquire()
+            delay = PUBLISH_RETRY_DELAY * 2 ** (attempt - 1)
+            try:
+                response = get_http_client().post(
+                    url,
+                    headers={"Authorization": f"Bearer {token}"},
+                    data={"caption": caption},
+                    files={"image": ("post.jpg", image_data, "image/jpeg")},
+                    timeout=PUBLISH_TIMEOUT
+                )
+            except requests.exceptions.RequestException as e:
+                result["error"] = f"Error connecting to {platform.capitalize()}: {str(e)}"
+            else:
+                if response.status_code < 300:
+                    try:
+                        result["post_id"] = response.json().get("id")
+                    except ValueError:
+                        pass
+                    result.update(ok=True, error=None)
+                    break
+                result["error"] = f"{platform.capitalize()} returned {response.status_code}: {response.text[:200]}"
+                if response.status_code != 429 and response.status_code < 500:
+                    # Client errors (bad token, rejected media, ...) will not succeed on retry
+                    break
+                delay = _retry_after(response, delay)
+            if attempt <= PUBLISH_MAX_RETRIES:
+                time.sleep(delay)
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def publish_to_platforms(images: Dict[str, bytes], caption: str) -> Iterator[Dict]:
+    """Publish to every platform in ``images`` at once.
+
+    ``images`` maps platform -> JPEG bytes. Results from publish_to_platform
+    are yielded as each platform finishes, fastest first.
+    """
+    futures = [_publish_executor.submit(publish_to_platform, platform, data, caption)
+               for platform, data in images.items()]
+    for future in as_completed(futures):
+        yield future.result()
+
+
+def post_to_social_media(platform: str, image_data: bytes, caption: str) -> bool:
+    result = publish_to_platform(platform, image_data, caption)
+    if result["ok"]:
+        suffix = " (simulation)" if result["post_id"] == "simulated" else ""
+        st.success(f"Post successfully shared to {platform.capitalize()}!{suffix}")
+    else:
+        st.warning(result["error"])
+    return result["ok"]
+
+
+# Scheduled posts live in a SQLite file shared by every app replica on the
+# host. Each process with SCHEDULE_DISPATCHER set publishes due posts from it.
+SCHEDULE_DB_PATH = get_secret("SCHEDULE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "schedule.db"))
+SCHEDULE_WORKERS = int(get_secret("SCHEDULE_WORKERS", 4))
+SCHEDULE_DISPATCHER = str(get_secret("SCHEDULE_DISPATCHER", "true")).lower() in ("1", "true", "yes")
+_post_scheduler = None
+_post_scheduler_lock = threading.Lock()
+
+
+def get_post_scheduler() -> "PostScheduler":
+    """Return the process-wide post scheduler, starting its dispatcher on first use.
+
+    The dispatcher only runs when SCHEDULE_DISPATCHER is set.
+    """
+    global _post_scheduler
+    if _post_scheduler is None:
+        with _post_scheduler_lock:
+            if _post_scheduler is None:
+                # Imported here so processes that never use the queue skip it
+                from scheduler import PostDispatcher, PostScheduler
+
+                os.makedirs(os.path.dirname(os.path.abspath(SCHEDULE_DB_PATH)), exist_ok=True)
+                scheduler = PostScheduler(SCHEDULE_DB_PATH)
+                if SCHEDULE_DISPATCHER:
+                    # publish_to_platform makes no Streamlit calls, so it is safe off the script thread
+                    PostDispatcher(scheduler, publish_to_platform, workers=SCHEDULE_WORKERS).start()
+                _post_scheduler = scheduler
+    return _post_scheduler
+
+
+def start_post_dispatcher():
+    """Start publishing queued posts at startup, so jobs left from a restart go out on time."""
+    if not SCHEDULE_DISPATCHER:
+        return
+    try:
+        get_post_scheduler()
+    except (OSError, sqlite3.Error) as e:
+        st.warning(f"Scheduled posts will not be published: {str(e)}")
+
+
+def schedule_post(caption: str, images: Dict[str, bytes], due_at: datetime) -> Optional[int]:
+    """Queue a post for the given platforms; returns the job id or None on error."""
+    try:
+        return get_post_scheduler().schedule(caption, images, due_at.timestamp())
+    except (OSError, sqlite3.Error, ValueError) as e:
+        st.error(f"Error scheduling post: {str(e)}")
+        return None
+
+
+def scheduled_posts() -> List[Dict]:
+    """Pending, claimed and failed scheduled posts, soonest first ([] if the queue cannot be read)."""
+    try:
+        return get_post_scheduler().jobs()
+    except (OSError, sqlite3.Error) as e:
+        st.warning(f"Could not read scheduled posts: {str(e)}")
+        return []
+
+
+# Generation/publish event log (JSONL, rotated and gzipped). An empty
+# GENERATION_LOG_PATH turns it off.
+GENERATION_LOG_PATH = get_secret("GENERATION_LOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "generation.jsonl"))
+GENERATION_LOG_MAX_MB = float(get_secret("GENERATION_LOG_MAX_MB", 10))
+GENERATION_LOG_BACKUPS = int(get_secret("GENERATION_LOG_BACKUPS", 20))
+LOGGED_CONTEXT_FIELDS = ("hotel_name", "hotel_location", "hotel_type", "occasion", "audience", "features",
+                         "special_offer", "image_style", "layout", "font", "font_size", "text_color")
+_event_log = None
+_event_log_lock = threading.Lock()
+
+
+def get_event_log() -> Optional["EventLog"]:
+    """Return the process-wide event log, or None when logging is disabled."""
+    global _event_log
+    if _event_log is None and GENERATION_LOG_PATH:
+        with _event_log_lock:
+            if _event_log is None:
+                from eventlog import EventLog
+                _event_log = EventLog(GENERATION_LOG_PATH, max_bytes=int(GENERATION_LOG_MAX_MB * 1024 * 1024),
+                                      backups=GENERATION_LOG_BACKUPS)
+    return _event_log
+
+
+def _content_size(value) -> Optional[object]:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, Image.Image):
+        return list(value.size)
+    return None
+
+
+def log_event(event: str, context: Optional[Dict] = None, prompts: Optional[Dict[str, str]] = None,
+              content: Optional[Dict] = None, timings: Optional[Dict[str, float]] = None,
+              sizes: Optional[Dict] = None, errors: Optional[Dict[str, str]] = None, **fields):
+    """Append one generation or publish record to the event log.
+
+    Prompts are stored as hashes only. content is a finish_post_content
+    result; its per-field timings, sizes and errors are merged with the
+    explicit arguments. Never blocks: the write happens on a background thread.
+    """
+    event_log = get_event_log()
+    if event_log is None:
+        return
+
+    timings = {**(content or {}).get("timings", {}), **(timings or {})}
+    errors = {**(content or {}).get("errors", {}), **(errors or {})}
+    sizes = dict(sizes or {})
+    if content is not None:
+        timings.setdefault("total", content.get("elapsed"))
+        for field in ("text", "image", "tagline"):
+            if field in content and field not in errors:
+                sizes.setdefault(field, _content_size(content[field]))
+
+    record = {
+        "ts": round(time.time(), 3),
+        "event": event,
+        "session": _rate_limit_client(),
+        "context": {field: (context or {})[field] for field in LOGGED_CONTEXT_FIELDS if field in (context or {})},
+        "prompt_hashes": {name: normalized_payload_key(prompt)[:16] for name, prompt in (prompts or {}).items() if prompt},
+        "timings": {stage: round(seconds, 4) for stage, seconds in timings.items() if seconds is not None},
+        "sizes": {name: size for name, size in sizes.items() if size is not None},
+        "outcome": "error" if errors else "ok",
+    }
+    if errors:
+        record["errors"] = errors
+    record.update(fields)
+    event_log.write(record)
+
+
+# Metrics export. METRICS_PORT serves GET /metrics (Prometheus text format);
+# METRICS_FILE is rewritten every METRICS_FILE_INTERVAL seconds for the
+# node_exporter textfile collector. SHOW_ADMIN_PANEL adds p50/p95/p99 per
+# stage to the sidebar.
+METRICS_PORT = int(get_secret("METRICS_PORT", 0))
+METRICS_FILE = get_secret("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = float(get_secret("METRICS_FILE_INTERVAL", 15))
+SHOW_ADMIN_PANEL = str(get_secret("SHOW_ADMIN_PANEL", "false")).lower() in ("1", "true", "yes")
+
+
+def _cache_gauges() -> Dict[str, float]:
+    gauges = {}
+    for name, stats in (("llm", llm_cache.stats()), ("image", image_cache.stats())):
+        for field, value in stats.items():
+            gauges[f'{field}{{cache="{name}"}}'] = value
+    return gauges
+
+
+def _rate_limit_gauges() -> Dict[str, float]:
+    gauges = {}
+    for provider, stats in rate_limit_stats().items():
+        for field in ("queued", "served", "throttled", "mean_wait"):
+            gauges[f'{field}{{provider="{provider}"}}'] = stats[field]
+    return gauges
+
+
+metrics.add_collector("cache", _cache_gauges)
+metrics.add_collector("rate_limit", _rate_limit_gauges)
+
+_metrics_export_started = False
+_metrics_export_lock = threading.Lock()
+
+
+def _write_metrics_file_forever():
+    while True:
+        try:
+            write_metrics_file(METRICS_FILE, metrics)
+        except OSError:
+            pass
+        time.sleep(METRICS_FILE_INTERVAL)
+
+
+def start_metrics_export():
+    """Start the configured metrics exporters once per process."""
+    global _metrics_export_started
+    with _metrics_export_lock:
+        if _metrics_export_started:
+            return
+        _metrics_export_started = True
+        if METRICS_PORT:
+            try:
+                serve_metrics(METRICS_PORT, metrics)
+            except OSError as e:
+                # Another replica on this host already has the port
+                st.warning(f"Metrics endpoint not started on port {METRICS_PORT}: {str(e)}")
+        if METRICS_FILE:
+            threading.Thread(target=_write_metrics_file_forever, name="bookingjini-metrics-file", daemon=True).start()
+
+
+def metrics_summary() -> Dict[str, Dict[str, float]]:
+    """p50/p95/p99 latency, errors, payload sizes and cache hit rate per stage."""
+    return metrics.summary()
+
+
+def metrics_text() -> str:
+    return metrics.prometheus_text()
 
 def change_tab(tab_index):
     st.session_state.current_tab = tab_index
 
+@functools.lru_cache(maxsize=8)
 def load_icon(image_path):
     with open(image_path, "rb") as img_file:
         return img_file.read()
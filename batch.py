@@ -0,0 +1,198 @@
+"""Headless batch campaign generator.
+
+Reads one job per line from a JSONL file and, for each job, generates the
+caption, background image and tagline, applies the layout and writes the
+results to an output directory:
+
+    python batch.py jobs.jsonl --out campaign_output --workers 4
+
+Each job is a JSON object such as
+
+    {"hotel_name": "Rambagh Palace", "hotel_location": "Jaipur",
+     "occasion": "Diwali", "audience": "Families",
+     "features": ["Pool", "Spa"], "layout": "Festive Diya"}
+
+Optional keys: "id", "hotel_type", "special_offer", "image_style", "font",
+"font_size", "text_color" and "logo" (a path to an image file).
+
+A job is finished once its ``<id>.json`` manifest exists in the output
+directory. Re-running the same command after a crash skips finished jobs
+and only generates the rest. API keys are read from .streamlit/secrets.toml
+or, failing that, from the environment.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Tuple
+
+from PIL import Image
+
+from backend import (apply_layout,
+                     build_caption_prompt,
+                     build_image_prompt,
+                     encode_jpeg,
+                     generate_post_content,
+                     log_event)
+from cache import payload_key
+
+REQUIRED_FIELDS = ("hotel_name", "hotel_location", "occasion", "audience")
+
+
+def job_id(job: Dict) -> str:
+    """Explicit "id" if given, else a readable slug plus a content hash."""
+    if job.get("id"):
+        return re.sub(r"[^A-Za-z0-9_.-]+", "-", str(job["id"])).strip("-")
+    slug = re.sub(r"[^a-z0-9]+", "-", f"{job['hotel_name']} {job['occasion']}".lower()).strip("-")
+    return f"{slug}-{payload_key(job)[:10]}"
+
+
+def read_jobs(path: str) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line number, job) pairs, skipping blank and comment lines."""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            job = json.loads(line)
+            missing = [field for field in REQUIRED_FIELDS if not job.get(field)]
+            if missing:
+                raise ValueError(f"{path}:{line_no}: job is missing {', '.join(missing)}")
+            yield line_no, job
+
+
+def _write_atomic(path: str, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def run_job(job: Dict, out_dir: str) -> Dict:
+    """Generate, lay out and save one post. Returns the manifest it wrote."""
+    name = job_id(job)
+    start = time.perf_counter()
+
+    prompts = {
+        "caption": build_caption_prompt(job),
+        "image": build_image_prompt(job),
+        "tagline": f"{job['hotel_name']} / {job['occasion']} / {job['audience']}",
+    }
+    content = generate_post_content(
+        text_prompt=prompts["caption"],
+        image_prompt=prompts["image"],
+        tagline_context=(job["hotel_name"], job["occasion"], job["audience"])
+    )
+    log_event("batch", job, prompts=prompts, content=content, job_id=name)
+    if content["errors"]:
+        raise RuntimeError("; ".join(f"{field}: {message}" for field, message in content["errors"].items()))
+
+    logo = Image.open(job["logo"]).convert("RGBA") if job.get("logo") else None
+    composite = apply_layout(
+        content["image"],
+        content["tagline"],
+        job.get("layout", "Festive Diya"),
+        [job.get("text_color", "#FFFFFF")],
+        job.get("font", "Arial"),
+        logo,
+        font_large_size=int(job.get("font_size", 50))
+    )
+
+    image_path = os.path.join(out_dir, f"{name}.jpg")
+    _write_atomic(image_path, encode_jpeg(composite, quality=90))
+    _write_atomic(os.path.join(out_dir, f"{name}.txt"), content["text"].encode("utf-8"))
+
+    manifest = {
+        "id": name,
+        "job": job,
+        "image": os.path.basename(image_path),
+        "caption": content["text"],
+        "tagline": content["tagline"],
+        "generation_seconds": round(content["elapsed"], 3),
+        "total_seconds": round(time.perf_counter() - start, 3),
+    }
+    # The manifest is written last: its presence marks the job as done
+    _write_atomic(os.path.join(out_dir, f"{name}.json"),
+                  json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+    return manifest
+
+
+def run_batch(jobs: List[Dict], out_dir: str, workers: int = 4) -> Dict:
+    """Run jobs through a bounded worker pool and return a summary."""
+    os.makedirs(out_dir, exist_ok=True)
+    summary = {"total": len(jobs), "completed": 0, "skipped": 0, "failed": 0, "failures": {}}
+
+    pending = []
+    for job in jobs:
+        if os.path.exists(os.path.join(out_dir, f"{job_id(job)}.json")):
+            summary["skipped"] += 1
+        else:
+            pending.append(job)
+
+    start = time.perf_counter()
+    latencies = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bookingjini-batch") as executor:
+        in_flight = {}
+        queue = iter(pending)
+        while True:
+            # Keep at most 2 * workers jobs queued so huge job files stay cheap
+            while len(in_flight) < workers * 2:
+                job = next(queue, None)
+                if job is None:
+                    break
+                in_flight[executor.submit(run_job, job, out_dir)] = job
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = in_flight.pop(future)
+                name = job_id(job)
+                try:
+                    manifest = future.result()
+                except Exception as e:
+                    summary["failed"] += 1
+                    summary["failures"][name] = str(e)
+                    print(f"FAILED  {name}: {e}", file=sys.stderr, flush=True)
+                else:
+                    summary["completed"] += 1
+                    latencies.append(manifest["total_seconds"])
+                    print(f"done    {name} ({manifest['total_seconds']:.1f}s)", flush=True)
+
+    elapsed = time.perf_counter() - start
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["posts_per_minute"] = round(summary["completed"] / elapsed * 60, 2) if elapsed > 0 else 0.0
+    summary["mean_job_seconds"] = round(sum(latencies) / len(latencies), 3) if latencies else 0.0
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate hotel posts in bulk from a JSONL job file.")
+    parser.add_argument("jobs", help="JSONL file with one job per line")
+    parser.add_argument("--out", default="campaign_output", help="output directory (default: campaign_output)")
+    parser.add_argument("--workers", type=int, default=4, help="jobs processed concurrently (default: 4)")
+    args = parser.parse_args(argv)
+
+    jobs = [job for _, job in read_jobs(args.jobs)]
+    summary = run_batch(jobs, args.out, workers=max(1, args.workers))
+
+    print()
+    print(f"Jobs:        {summary['total']} total, {summary['completed']} completed, "
+          f"{summary['skipped']} already done, {summary['failed']} failed")
+    print(f"Elapsed:     {summary['elapsed_seconds']:.1f}s")
+    print(f"Throughput:  {summary['posts_per_minute']:.2f} posts/min "
+          f"(mean {summary['mean_job_seconds']:.1f}s per post)")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
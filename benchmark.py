@@ -0,0 +1,475 @@
+"""Rendering and generation benchmarks for the backend.
+
+    python benchmark.py rangoli --sizes 1024 2048 4096
+    python benchmark.py layouts --sizes 512 1024 2048 --json layouts.json
+    python benchmark.py pipeline --latency 0.3 --json pipeline.json
+    python benchmark.py all --json results.json
+    python benchmark.py startup --json startup.json
+    python benchmark.py compare old.json new.json
+
+The rangoli benchmark times the cell-by-cell renderer that apply_layout
+used to run against the tiled renderer in backend._render_rangoli_overlay,
+and checks that both produce identical pixels.
+
+The layouts benchmark times apply_layout for every layout in
+backend.LAYOUTS across canvas sizes, fonts, text lengths and with or
+without a logo. It reports wall and CPU time and peak memory, plus the
+first ("cold") render, which also builds the layout's decoration overlay.
+
+The pipeline benchmark times generate_promotional_tagline,
+generate_text_with_llama, generate_image_with_stability and the combined
+generate_post_content end to end against mock_api.py with injected
+latency. Response caches are bypassed so every call makes a request.
+
+The startup benchmark times a cold ``import backend`` and the first
+page load of frontend.py in fresh interpreters, then the per-rerun cost
+of the page in a warm process (Streamlit's AppTest, no browser needed),
+and lists the slowest top-level imports from ``python -X importtime``.
+
+--json writes the results with some run metadata; compare prints the
+change in median time between two such files.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import PIL
+from PIL import Image, ImageDraw
+
+import backend
+from cache import DiskImageCache
+from mock_api import MockAPIServer
+from ratelimit import ProviderLimiter
+
+LAYOUT_SIZES = [512, 1024, 2048]
+LAYOUT_FONTS = ["Arial", "Times New Roman", "Impact"]
+TEXT_LENGTHS = {
+    "short": "Diwali Delights Await",
+    "medium": "Celebrate the festival of lights with a royal stay at Rambagh Palace this Diwali",
+    "long": ("Celebrate the festival of lights with a royal stay at Rambagh Palace this Diwali. "
+             "Enjoy candle-lit dinners, traditional sweets, rangoli workshops for the little ones "
+             "and an evening of fireworks over the palace gardens. Book three nights and get the "
+             "fourth free, with complimentary spa treatments for every guest."),
+}
+
+
+def _time_call(func: Callable, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class PeakMemory:
+    """Peak memory growth (MB) while the block runs.
+
+    On Linux the process's peak RSS is reset through /proc/self/clear_refs,
+    which also counts Pillow's image buffers. Elsewhere tracemalloc is used,
+    which only sees allocations made through Python.
+    """
+
+    def __init__(self):
+        self.peak_mb = 0.0
+        self.method = "rss" if self._can_reset_rss() else "tracemalloc"
+
+    @staticmethod
+    def _can_reset_rss() -> bool:
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _status_kb(field: str) -> int:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+        return 0
+
+    def __enter__(self):
+        if self.method == "rss":
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            self._baseline = self._status_kb("VmRSS")
+        else:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.method == "rss":
+            self.peak_mb = max(0, self._status_kb("VmHWM") - self._baseline) / 1024
+        else:
+            self.peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        return False
+
+
+def _measure(func: Callable, repeat: int, setup: Optional[Callable] = None) -> Dict:
+    """Median/p95 wall time, median CPU time and peak memory over repeat calls."""
+    wall, cpu, peaks = [], [], []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        with PeakMemory() as memory:
+            cpu_start = time.process_time()
+            start = time.perf_counter()
+            func(*args)
+            wall.append(time.perf_counter() - start)
+            cpu.append(time.process_time() - cpu_start)
+        peaks.append(memory.peak_mb)
+    return {
+        "median_ms": statistics.median(wall) * 1000,
+        "p95_ms": _percentile(wall, 95) * 1000,
+        "cpu_ms": statistics.median(cpu) * 1000,
+        "peak_mb": max(peaks),
+        "memory_method": memory.method,
+    }
+
+
+def render_rangoli_per_cell(width: int, height: int, pattern_size: int = backend.RANGOLI_PATTERN_SIZE) -> Image.Image:
+    """The original renderer: one flower drawn per cell, in Python."""
+    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    overlay_draw = ImageDraw.Draw(overlay)
+    for i in range(0, width, pattern_size):
+        for j in range(0, height, pattern_size):
+            backend._draw_rangoli_cell(overlay_draw, i + pattern_size // 2, j + pattern_size // 2, pattern_size)
+    return overlay
+
+
+def bench_rangoli(sizes: List[int], repeat: int = 5) -> List[Dict]:
+    results = []
+    for size in sizes:
+        reference = render_rangoli_per_cell(size, size)
+        tiled = backend._render_rangoli_overlay(size, size)
+        per_cell = _time_call(lambda: render_rangoli_per_cell(size, size), repeat)
+        stamped = _time_call(lambda: backend._render_rangoli_overlay(size, size), repeat)
+        results.append({
+            "size": size,
+            "per_cell_ms": statistics.median(per_cell) * 1000,
+            "tiled_ms": statistics.median(stamped) * 1000,
+            "identical": reference.tobytes() == tiled.tobytes(),
+        })
+    return results
+
+
+def _background(size: int) -> Image.Image:
+    # A gradient rather than a flat fill, so JPEG/alpha work is realistic
+    gradient = Image.linear_gradient("L").resize((size, size))
+    return Image.merge("RGB", (gradient, gradient.rotate(90), Image.new("L", (size, size), 96)))
+
+
+def _logo() -> Image.Image:
+    logo = Image.new("RGBA", (240, 120), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(logo)
+    draw.rounded_rectangle((0, 0, 239, 119), radius=24, fill=(180, 30, 40, 230))
+    draw.text((30, 45), "BookingJini", fill=(255, 255, 255, 255))
+    return logo
+
+
+def bench_layouts(layouts: List[str], sizes: List[int], fonts: List[str], lengths: List[str],
+                  repeat: int = 3) -> List[Dict]:
+    results = []
+    logo = _logo()
+    for size in sizes:
+        background = _background(size)
+        for layout, font, length, with_logo in itertools.product(layouts, fonts, lengths, (False, True)):
+            text = TEXT_LENGTHS[length]
+            render = lambda image: backend.apply_layout(image, text, layout, ["#FFFFFF"], font,
+                                                        logo if with_logo else None)
+            # The first render also builds the layout overlay for this size
+            with backend._overlay_cache_lock:
+                backend._overlay_cache.clear()
+            cold = _measure(render, 1, setup=lambda: (background.copy(),))
+            warm = _measure(render, repeat, setup=lambda: (background.copy(),))
+            results.append({
+                "layout": layout,
+                "size": size,
+                "font": font,
+                "text": length,
+                "logo": with_logo,
+                "cold_ms": cold["median_ms"],
+                **warm,
+            })
+    return results
+
+
+def _fresh_llm_cache() -> tuple:
+    backend.llm_cache.clear()
+    return ()
+
+
+def bench_pipeline(latency: float, repeat: int = 5) -> List[Dict]:
+    server = MockAPIServer(("127.0.0.1", 0), latency=latency)
+    server.start()
+    saved = {name: getattr(backend, name) for name in
+             ("GROQ_API_KEY", "STABILITY_API_KEY", "GROQ_CHAT_URL", "STABILITY_TEXT_TO_IMAGE_URL",
+              "image_cache", "rate_limiters")}
+    cache_dir = tempfile.mkdtemp(prefix="bookingjini-bench-")
+    try:
+        backend.GROQ_API_KEY = backend.GROQ_API_KEY or "benchmark"
+        backend.STABILITY_API_KEY = backend.STABILITY_API_KEY or "benchmark"
+        backend.GROQ_CHAT_URL = f"{server.url}/openai/v1/chat/completions"
+        backend.STABILITY_TEXT_TO_IMAGE_URL = f"{server.url}/v1/generation/stable-diffusion-v1-6/text-to-image"
+        # Measure the pipeline itself, not the production rate limits
+        backend.rate_limiters = {provider: ProviderLimiter(limiter.name, rpm=1e9)
+                                 for provider, limiter in saved["rate_limiters"].items()}
+        backend.image_cache = DiskImageCache(cache_dir, 512 * 1024 * 1024)
+
+        context = {"hotel_name": "Rambagh Palace", "hotel_location": "Jaipur", "occasion": "Diwali",
+                   "audience": "Families", "features": ["Pool", "Spa"]}
+        caption_prompt = backend.build_caption_prompt(context)
+        image_prompt = backend.build_image_prompt(context)
+        tagline_args = (context["hotel_name"], context["occasion"], context["audience"])
+        stages = {
+            "generate_promotional_tagline": lambda: backend.generate_promotional_tagline(*tagline_args),
+            "generate_text_with_llama": lambda: backend.generate_text_with_llama(caption_prompt),
+            "generate_image_with_stability": lambda: backend.generate_image_with_stability(image_prompt,
+                                                                                           use_cache=False),
+            "generate_post_content": lambda: backend.generate_post_content(caption_prompt, image_prompt,
+                                                                           tagline_args),
+        }
+
+        results = []
+        for stage, func in stages.items():
+            # Warm the connection pool so the first sample is not a handshake
+            backend.llm_cache.clear()
+            func()
+            measured = _measure(func, repeat, setup=_fresh_llm_cache)
+            results.append({
+                "stage": stage,
+                "latency_s": latency,
+                "overhead_ms": measured["median_ms"] - latency * 1000,
+                **measured,
+            })
+        return results
+    finally:
+        for name, value in saved.items():
+            setattr(backend, name, value)
+        server.shutdown()
+        server.server_close()
+        DiskImageCache(cache_dir, 0).clear()
+        os.rmdir(cache_dir)
+
+
+# Runs in a fresh interpreter so nothing is imported yet
+_COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+if sys.argv[1] == "import":
+    import backend
+else:
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file("frontend.py", default_timeout=60)
+    import backend
+    backend.HTTP_WARMUP = False
+    app.run()
+print(json.dumps({"seconds": time.perf_counter() - start}))
+"""
+
+
+def _cold_start(stage: str) -> float:
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, "-c", _COLD_START_SCRIPT, stage], capture_output=True, text=True,
+                            cwd=here, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])["seconds"]
+
+
+def slowest_imports(module: str = "backend", top: int = 8) -> List[Dict]:
+    """Top-level imports of ``module`` by cumulative import time (python -X importtime)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    report = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                            text=True, cwd=here, check=True).stderr
+    imports = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Direct imports are indented two spaces more than the module itself
+        if name.startswith("   ") and not name.startswith("    ") or name.strip() == module:
+            imports.append({"module": name.strip(), "cumulative_ms": int(cumulative) / 1000})
+    return sorted(imports, key=lambda row: -row["cumulative_ms"])[:top]
+
+
+def bench_startup(repeat: int = 5) -> List[Dict]:
+    """Cold import and first page load (fresh interpreters), then warm reruns."""
+    from streamlit.testing.v1 import AppTest
+
+    results = []
+    for stage, label in (("import", "import backend (cold)"), ("page", "first page load (cold)")):
+        timings = [_cold_start(stage) for _ in range(repeat)]
+        results.append({"stage": label, "median_ms": statistics.median(timings) * 1000,
+                        "p95_ms": _percentile(timings, 95) * 1000})
+
+    # No background handshakes with the real API hosts during the benchmark
+    saved = getattr(backend, "HTTP_WARMUP", False)
+    backend.HTTP_WARMUP = False
+    try:
+        app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend.py"),
+                                default_timeout=60)
+        app.run()
+        timings = _time_call(app.run, repeat * 2)
+    finally:
+        backend.HTTP_WARMUP = saved
+    results.append({"stage": "page rerun (warm)", "median_ms": statistics.median(timings) * 1000,
+                    "p95_ms": _percentile(timings, 95) * 1000})
+    return results
+
+
+def run_metadata() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _result_key(section: str, result: Dict) -> tuple:
+    fields = {"rangoli": ("size",), "layouts": ("layout", "size", "font", "text", "logo"),
+              "pipeline": ("stage",), "startup": ("stage",)}[section]
+    return tuple(result[field] for field in fields)
+
+
+def compare(old: Dict, new: Dict, threshold: float = 10.0) -> List[str]:
+    """Lines describing median-time changes between two --json result files."""
+    lines = []
+    timing = {"rangoli": "tiled_ms", "layouts": "median_ms", "pipeline": "median_ms", "startup": "median_ms"}
+    for section, field in timing.items():
+        before = {_result_key(section, r): r[field] for r in old.get(section, [])}
+        for result in new.get(section, []):
+            key = _result_key(section, result)
+            if key not in before or not before[key]:
+                continue
+            change = (result[field] - before[key]) / before[key] * 100
+            if abs(change) >= threshold:
+                label = " / ".join(str(part) for part in key)
+                lines.append(f"{section:<9} {label:<60} {before[key]:>9.1f}ms -> {result[field]:>9.1f}ms "
+                             f"({change:+.0f}%)")
+    return lines
+
+
+def _print_layouts(results: List[Dict]):
+    print(f"{'layout':<17} {'size':>5} {'font':<16} {'text':<6} {'logo':<5} "
+          f"{'cold':>9} {'median':>9} {'p95':>9} {'cpu':>9} {'peak':>8}")
+    for r in results:
+        print(f"{r['layout']:<17} {r['size']:>5} {r['font']:<16} {r['text']:<6} {str(r['logo']):<5} "
+              f"{r['cold_ms']:>7.1f}ms {r['median_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms "
+              f"{r['cpu_ms']:>7.1f}ms {r['peak_mb']:>6.1f}MB")
+
+
+def _print_pipeline(results: List[Dict]):
+    print(f"{'stage':<31} {'median':>9} {'p95':>9} {'overhead':>9} {'cpu':>9} {'peak':>8}")
+    for r in results:
+        print(f"{r['stage']:<31} {r['median_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms {r['overhead_ms']:>7.1f}ms "
+              f"{r['cpu_ms']:>7.1f}ms {r['peak_mb']:>6.1f}MB")
+
+
+def _print_startup(results: List[Dict], imports: List[Dict]):
+    print(f"{'stage':<31} {'median':>9} {'p95':>9}")
+    for r in results:
+        print(f"{r['stage']:<31} {r['median_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms")
+    print()
+    print(f"{'slowest imports':<31} {'cumulative':>10}")
+    for row in imports:
+        print(f"{row['module']:<31} {row['cumulative_ms']:>8.1f}ms")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="BookingJini rendering and generation benchmarks.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rangoli = subparsers.add_parser("rangoli", help="per-cell vs tiled Festive Rangoli overlay")
+    rangoli.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048, 4096])
+    rangoli.add_argument("--repeat", type=int, default=5)
+
+    layouts = subparsers.add_parser("layouts", help="apply_layout across layouts, sizes, fonts and texts")
+    pipeline = subparsers.add_parser("pipeline", help="generate_* functions against a local mock API")
+    everything = subparsers.add_parser("all", help="layouts and pipeline benchmarks")
+    for sub in (layouts, everything):
+        sub.add_argument("--layouts", nargs="+", default=list(backend.LAYOUTS), metavar="LAYOUT")
+        sub.add_argument("--sizes", type=int, nargs="+", default=LAYOUT_SIZES)
+        sub.add_argument("--fonts", nargs="+", default=LAYOUT_FONTS)
+        sub.add_argument("--lengths", nargs="+", choices=list(TEXT_LENGTHS), default=list(TEXT_LENGTHS))
+    for sub in (pipeline, everything):
+        sub.add_argument("--latency", type=float, default=0.3, help="injected API latency in seconds")
+        sub.add_argument("--pipeline-repeat", type=int, default=5)
+    for sub in (rangoli, layouts, pipeline, everything):
+        sub.add_argument("--json", help="write results to this file")
+    for sub in (layouts, everything):
+        sub.add_argument("--repeat", type=int, default=3)
+
+    startup = subparsers.add_parser("startup", help="cold import, first page load and rerun time")
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.add_argument("--json", help="write results to this file")
+
+    comparison = subparsers.add_parser("compare", help="median-time changes between two --json files")
+    comparison.add_argument("old")
+    comparison.add_argument("new")
+    comparison.add_argument("--threshold", type=float, default=10.0, help="minimum change to report, in percent")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        lines = compare(old, new, args.threshold)
+        print("\n".join(lines) if lines else f"No changes of {args.threshold:.0f}% or more.")
+        return 0
+
+    output = {"meta": run_metadata()}
+    status = 0
+    if args.command == "rangoli":
+        results = output["rangoli"] = bench_rangoli(args.sizes, args.repeat)
+        print(f"{'size':>6}  {'per-cell':>10}  {'tiled':>10}  {'speedup':>8}  identical")
+        for r in results:
+            print(f"{r['size']:>6}  {r['per_cell_ms']:>8.1f}ms  {r['tiled_ms']:>8.1f}ms  "
+                  f"{r['per_cell_ms'] / r['tiled_ms']:>7.1f}x  {r['identical']}")
+        status = 0 if all(r["identical"] for r in results) else 1
+    if args.command in ("layouts", "all"):
+        output["layouts"] = bench_layouts(args.layouts, args.sizes, args.fonts, args.lengths, args.repeat)
+        _print_layouts(output["layouts"])
+    if args.command in ("pipeline", "all"):
+        output["pipeline"] = bench_pipeline(args.latency, args.pipeline_repeat)
+        _print_pipeline(output["pipeline"])
+
+    if args.command == "startup":
+        output["startup"] = bench_startup(args.repeat)
+        output["imports"] = slowest_imports()
+        _print_startup(output["startup"], output["imports"])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
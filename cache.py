@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+
+def payload_key(*parts) -> str:
+    """Stable SHA-256 hex digest of JSON-serialisable request parts."""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Collapse runs of whitespace so reformatted prompts share a key."""
+    return " ".join(text.split())
+
+
+def normalized_payload_key(*parts) -> str:
+    """Like payload_key, but whitespace in every string is normalised first."""
+    def normalize(value):
+        if isinstance(value, str):
+            return normalize_text(value)
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        return value
+    return payload_key(*[normalize(part) for part in parts])
+
+
+class DiskImageCache:
+    """Content-addressed on-disk cache for generated image bytes.
+
+    Entries are stored as ``<key>.png`` under ``directory``, where the key is
+    a hash of the full generation payload. The total size is capped at
+    ``max_bytes``; when a write would exceed it the least recently used
+    entries are evicted. Writes go to a temporary file in the same directory
+    and are moved into place with os.replace, so readers never see a partial
+    image even with several processes sharing the directory.
+    """
+
+    suffix = ".png"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _load_index(self):
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            found.append((stat.st_mtime, name[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached bytes for ``key`` or None, updating recency."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                if key in self._entries:
+                    self._total_bytes -= self._entries.pop(key)
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key not in self._entries:
+                # Written by another process sharing the directory
+                self._total_bytes += len(data)
+            self._entries[key] = len(data)
+            self._entries.move_to_end(key)
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Atomically store ``data`` under ``key`` and evict down to the cap."""
+        if len(data) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        self._record_write(key, len(data))
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> str:
+        """Atomically store streamed bytes under ``key`` and return the path.
+
+        The chunks go straight to disk, so the whole image never has to be
+        held in memory. Raises OSError if the entry cannot be written.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            path = self._path(key)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._record_write(key, size)
+        return path
+
+    def _record_write(self, key: str, size: int):
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            victims = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                victim, victim_size = self._entries.popitem(last=False)
+                self._total_bytes -= victim_size
+                self.evictions += 1
+                victims.append(victim)
+        for victim in victims:
+            try:
+                os.remove(self._path(victim))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._total_bytes = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+
+class ResponseCache:
+    """Bounded in-process TTL cache that keeps several variants per key.
+
+    Each key holds up to ``variants`` responses, each expiring ``ttl``
+    seconds after it was stored, and get() returns one at random. A key
+    answers as soon as it has one live variant; until its set is full, a
+    lookup misses with probability (missing variants / variants), so the
+    caller asks the API again and adds variety. A popular prompt saves
+    calls from its second request instead of its (variants + 1)th. At most
+    ``max_entries`` keys are kept; the least recently used key is dropped
+    first.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, variants: int = 1):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> [(expires_at, value), ...]
+
+    def _live(self, key: str, now: float) -> list:
+        values = [item for item in self._entries.get(key, []) if item[0] > now]
+        if values:
+            self._entries[key] = values
+        else:
+            self._entries.pop(key, None)
+        return values
+
+    def get(self, key: str):
+        """Return a random cached variant for ``key``, or None on a miss."""
+        with self._lock:
+            values = self._live(key, time.monotonic())
+            missing = self.variants - len(values)
+            if not values or (missing > 0 and random.random() < missing / self.variants):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return random.choice(values)[1]
+
+    def put(self, key: str, value):
+        """Add ``value`` as a variant for ``key``, replacing the oldest if full."""
+        with self._lock:
+            now = time.monotonic()
+            values = self._live(key, now)
+            values = [item for item in values if item[1] != value]
+            values.append((now + self.ttl, value))
+            self._entries[key] = values[-self.variants:]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
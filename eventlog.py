@@ -0,0 +1,227 @@
+"""Append-only JSONL log of generation and publish events.
+
+Each event is one JSON object per line. EventLog.write() only puts the
+record on a queue; a background thread batches queued records into the
+file, so the Streamlit script thread never waits on disk. When the live
+file grows past ``max_bytes`` it is renamed, gzip-compressed in the
+background thread and the oldest ``backups`` compressed files are kept:
+
+    logs/generation.jsonl
+    logs/generation.20261016-221503123456.4242.jsonl.gz
+    ...
+
+Several processes may append to the same path: small appends are atomic,
+and a writer that finds the live file was rotated by another process
+reopens it. Summarise the live and rotated files offline with
+
+    python eventlog.py summary logs/generation.jsonl
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import statistics
+import sys
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class EventLog:
+    """Buffered, size-rotated JSONL writer running on a daemon thread."""
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 20,
+                 flush_interval: float = 1.0, max_queue: int = 10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._file = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="bookingjini-eventlog", daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict):
+        """Queue a record without blocking; it is dropped if the queue is full."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        """Flush queued records and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {"written": self.written, "dropped": self.dropped, "rotations": self.rotations,
+                "queued": self._queue.qsize()}
+
+    def _open(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _reopen_if_rotated(self):
+        # Another process may have rotated the live file under us
+        try:
+            rotated = os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            self._open()
+
+    def _run(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [record]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = [json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in batch if r is not None]
+            if lines:
+                try:
+                    self._write(lines)
+                except OSError:
+                    self.dropped += len(lines)
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                return
+
+    def _write(self, lines: List[str]):
+        if self._file is None:
+            self._open()
+        else:
+            self._reopen_if_rotated()
+        self._file.write("".join(lines))
+        self._file.flush()
+        self.written += len(lines)
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        base = self.path[:-len(".jsonl")] if self.path.endswith(".jsonl") else self.path
+        rotated = f"{base}.{datetime.now().strftime('%Y%m%d-%H%M%S%f')}.{os.getpid()}.jsonl"
+        try:
+            os.rename(self.path, rotated)
+        except FileNotFoundError:
+            return  # rotated by another process
+        with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+        self.rotations += 1
+        rotations = rotated_files(self.path)
+        for old in rotations[:max(0, len(rotations) - self.backups)]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def rotated_files(path: str) -> List[str]:
+    """Compressed rotations of ``path``, oldest first."""
+    base = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+    return sorted(glob.glob(glob.escape(base) + ".*.jsonl.gz"), key=os.path.getmtime)
+
+
+def read_events(path: str, event: Optional[str] = None) -> Iterator[Dict]:
+    """Records from the rotated files and then the live file, oldest first."""
+    files = rotated_files(path) + ([path] if os.path.exists(path) else [])
+    for name in files:
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(name, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a torn last line from a crashed writer
+                if event is None or record.get("event") == event:
+                    yield record
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(records: Iterable[Dict]) -> Dict:
+    """Event counts, outcomes, throughput and per-stage latency percentiles."""
+    events, outcomes = Counter(), Counter()
+    timings = defaultdict(list)
+    first = last = None
+    for record in records:
+        events[record.get("event")] += 1
+        outcomes[record.get("outcome")] += 1
+        ts = record.get("ts")
+        if ts is not None:
+            first = ts if first is None else min(first, ts)
+            last = ts if last is None else max(last, ts)
+        for stage, seconds in (record.get("timings") or {}).items():
+            if isinstance(seconds, (int, float)):
+                timings[stage].append(seconds)
+
+    total = sum(events.values())
+    span_hours = (last - first) / 3600 if first is not None and last > first else 0.0
+    latency = {}
+    for stage, values in sorted(timings.items()):
+        values.sort()
+        latency[stage] = {"count": len(values), "mean": statistics.fmean(values),
+                          "p50": _percentile(values, 50), "p95": _percentile(values, 95), "max": values[-1]}
+    return {
+        "records": total,
+        "events": dict(events),
+        "outcomes": dict(outcomes),
+        "first": datetime.fromtimestamp(first).isoformat(timespec="seconds") if first is not None else None,
+        "last": datetime.fromtimestamp(last).isoformat(timespec="seconds") if last is not None else None,
+        "per_hour": total / span_hours if span_hours else None,
+        "latency_seconds": latency,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Summarise a BookingJini event log and its rotations.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary = subparsers.add_parser("summary", help="throughput, outcomes and per-stage latency")
+    summary.add_argument("path", help="live log file, e.g. logs/generation.jsonl")
+    summary.add_argument("--event", help="only count this event type (generate, publish, ...)")
+    summary.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    result = summarize(read_events(args.path, args.event))
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+
+    print(f"Records:     {result['records']} ({result['first']} .. {result['last']})")
+    if result["per_hour"]:
+        print(f"Throughput:  {result['per_hour']:.1f} events/hour")
+    print("Events:      " + ", ".join(f"{name}={count}" for name, count in sorted(result["events"].items(), key=str)))
+    print("Outcomes:    " + ", ".join(f"{name}={count}" for name, count in sorted(result["outcomes"].items(), key=str)))
+    if result["latency_seconds"]:
+        print()
+        print(f"{'stage':<12} {'count':>7} {'mean':>8} {'p50':>8} {'p95':>8} {'max':>8}")
+        for stage, row in result["latency_seconds"].items():
+            print(f"{stage:<12} {row['count']:>7} {row['mean']:>7.2f}s {row['p50']:>7.2f}s "
+                  f"{row['p95']:>7.2f}s {row['max']:>7.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Font lookup and measurement for apply_layout.
+
+Font names in the UI ("Arial", "Times New Roman", ...) are resolved to font
+files once per process by scanning the usual system font directories.
+Names that are not installed fall back to metric-compatible or similar
+free fonts (Liberation, DejaVu, ...), which is what most Linux hosts have.
+Loaded FreeType fonts and per-word text widths are cached, so wrapping a
+tagline is mostly dictionary lookups.
+"""
+import os
+import re
+import sys
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from PIL import ImageFont
+
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+
+# Preferred files for each UI font, most faithful first. Entries are
+# matched against font file names with case, spaces, "-" and "_" ignored.
+FONT_CANDIDATES = {
+    "Arial": ["Arial", "LiberationSans-Regular", "Arimo-Regular", "Arimo", "DejaVuSans"],
+    "Helvetica": ["Helvetica", "NimbusSans-Regular", "LiberationSans-Regular", "Arimo-Regular", "DejaVuSans"],
+    "Times New Roman": ["Times New Roman", "times", "LiberationSerif-Regular", "Tinos-Regular",
+                        "NimbusRoman-Regular", "DejaVuSerif"],
+    "Courier New": ["Courier New", "cour", "LiberationMono-Regular", "Cousine-Regular",
+                    "NimbusMonoPS-Regular", "DejaVuSansMono"],
+    "Georgia": ["Georgia", "Gelasio-Regular", "DejaVuSerif"],
+    "Verdana": ["Verdana", "DejaVuSans"],
+    "Trebuchet MS": ["Trebuchet MS", "trebuc", "DejaVuSans"],
+    "Impact": ["Impact", "Anton-Regular", "Oswald-Regular", "DejaVuSans-Bold"],
+}
+
+
+def font_directories() -> List[str]:
+    """System and user font directories for the current platform."""
+    home = os.path.expanduser("~")
+    if sys.platform == "win32":
+        return [os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+                os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts")]
+    if sys.platform == "darwin":
+        return ["/System/Library/Fonts", "/System/Library/Fonts/Supplemental",
+                "/Library/Fonts", os.path.join(home, "Library", "Fonts")]
+    directories = [os.path.join(home, ".fonts"), os.path.join(home, ".local", "share", "fonts"),
+                   "/usr/local/share/fonts", "/usr/share/fonts"]
+    directories += [os.path.join(d, "fonts") for d in os.environ.get("XDG_DATA_DIRS", "").split(":") if d]
+    return directories
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[\s_\-]+", "", name).lower()
+
+
+_font_index = None
+_font_index_lock = threading.Lock()
+
+
+def font_index() -> Dict[str, str]:
+    """Map of normalised font file stem -> path, built on first call."""
+    global _font_index
+    if _font_index is None:
+        with _font_index_lock:
+            if _font_index is None:
+                index = {}
+                for directory in font_directories():
+                    for root, _, files in os.walk(directory):
+                        for name in files:
+                            stem, ext = os.path.splitext(name)
+                            if ext.lower() in FONT_EXTENSIONS:
+                                index.setdefault(_normalize(stem), os.path.join(root, name))
+                _font_index = index
+    return _font_index
+
+
+@lru_cache(maxsize=None)
+def resolve_font(font_name: str) -> Optional[str]:
+    """Path of the installed file to use for a UI font name, or None."""
+    if os.path.isfile(font_name):
+        return font_name
+    index = font_index()
+    for candidate in FONT_CANDIDATES.get(font_name, [font_name]):
+        key = _normalize(candidate)
+        for variant in (key, key + "regular", key + "mt"):
+            if variant in index:
+                return index[variant]
+    return None
+
+
+@lru_cache(maxsize=64)
+def get_font(font_name: str, size: int):
+    """Cached FreeType font for (name, size), or Pillow's default font."""
+    path = resolve_font(font_name)
+    try:
+        return ImageFont.truetype(path or font_name, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=8192)
+def text_width(font_name: str, size: int, text: str) -> int:
+    """Right edge of ``text`` drawn at x=0, as ImageDraw.textbbox reports it."""
+    return get_font(font_name, size).getbbox(text)[2]
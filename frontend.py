@@ -1,30 +1,44 @@
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import os
 from datetime import datetime
 import time
-import cv2
-import numpy as np
 from backend import (generate_promotional_tagline,
-                     generate_text_with_llama,
                      generate_image_with_stability,
-                     apply_layout,
-                     post_to_social_media,
+                     start_post_content,
+                     finish_post_content,
+                     stream_text_with_llama,
+                     stream_caption_and_tagline,
+                     generate_image_variants,
+                     generate_tagline_variants,
+                     variant_thumbnails,
+                     MAX_VARIANTS,
+                     CAPTION_TAGLINE_COMBINED,
+                     build_caption_prompt,
+                     build_image_prompt,
+                     render_preview,
+                     render_export,
+                     render_renditions,
+                     PLATFORM_RENDITIONS,
+                     SessionAssets,
+                     publish_to_platforms,
+                     schedule_post,
+                     scheduled_posts,
+                     start_post_dispatcher,
                      change_tab,
                      load_icon,
-                     validate_api_keys)
-import io
-import math
-
-GROQ_API_KEY = st.secrets.get("GROQ_API_KEY", "")
-STABILITY_API_KEY = st.secrets.get("STABILITY_API_KEY", "")
-
-SOCIAL_MEDIA_CREDENTIALS = {
-    "instagram": st.secrets.get("INSTAGRAM_TOKEN", ""),
-    "facebook": st.secrets.get("FACEBOOK_TOKEN", ""),
-    "twitter": st.secrets.get("TWITTER_TOKEN", ""),
-    "linkedin": st.secrets.get("LINKEDIN_TOKEN", "")
-}
+                     validate_api_keys,
+                     rate_limit_stats,
+                     start_metrics_export,
+                     log_event,
+                     metrics_summary,
+                     metrics_text,
+                     SHOW_ADMIN_PANEL,
+                     LAYOUTS,
+                     warm_connections,
+                     GROQ_API_KEY,
+                     STABILITY_API_KEY,
+                     SOCIAL_MEDIA_CREDENTIALS)
 
 # Font Options
 FONTS = [
@@ -141,20 +155,6 @@ COLOR_PALETTES = {
     "Sapphire Blue": ["#0F52BA"]
 }
 
-# Layouts with descriptions
-LAYOUTS = {
-    "Festive Diya": "Traditional diya pattern with warm glow effect",
-    "Festive Rangoli": "Colorful rangoli-inspired design with transparent overlay",
-    "Festive Toran": "Traditional toran design with decorative elements",
-    "Festive Mandala": "Intricate mandala pattern with transparent background",
-    "Festive Ganesha": "Elegant Ganesha pattern with divine aura",
-    "Festive Om": "Sacred Om symbol with spiritual elements",
-    "Festive Swastika": "Traditional swastika pattern with auspicious design",
-    "Festive Lotus": "Beautiful lotus pattern with blooming effect",
-    "Festive Peacock": "Majestic peacock design with colorful feathers",
-    "Festive Border": "Ornate border pattern with traditional motifs"
-}
-
 # Set page config
 st.set_page_config(
     page_title="BookingJini - AI Hotel Post Generator",
@@ -176,23 +176,38 @@ def main():
         st.session_state.current_tab = 0
     if 'generated_tagline' not in st.session_state:
         st.session_state.generated_tagline = ""
-    if 'final_image_path' not in st.session_state:
-        st.session_state.final_image_path = None
+    if 'assets' not in st.session_state:
+        st.session_state.assets = SessionAssets()
     if 'design_context' not in st.session_state:
         st.session_state.design_context = None
+    if 'caption_stats' not in st.session_state:
+        st.session_state.caption_stats = {}
+    if 'preview_cache' not in st.session_state:
+        st.session_state.preview_cache = {}
+    if 'image_variants' not in st.session_state:
+        st.session_state.image_variants = []
+        st.session_state.variant_thumbnails = []
+    if 'tagline_variants' not in st.session_state:
+        st.session_state.tagline_variants = []
+    if 'hotel_logo_upload' not in st.session_state:
+        st.session_state.hotel_logo_upload = None
+
+    start_metrics_export()
+    start_post_dispatcher()
+    warm_connections()
 
     # Validate API keys
     if not validate_api_keys():
         st.error("Please set up your API keys in the secrets.toml file before using the application.")
         return
 
-    # Set up the page with a JPG icon
+    # Set up the page with a JPG icon (read once per process)
     icon_path = os.path.join(os.path.dirname(__file__), "BJ.jpg")
-    if not os.path.exists(icon_path):
+    try:
+        icon_bytes = load_icon(icon_path)
+    except FileNotFoundError:
         st.error(f"Logo file not found at {icon_path}")
         return
-        
-    icon_bytes = load_icon(icon_path)
     if not icon_bytes:
         st.error("Failed to load the logo file")
         return
@@ -201,7 +216,7 @@ def main():
     col1, col2 = st.columns([0.15, 0.85])
 
     with col1:
-       st.image(icon_path, width=80)  
+       st.image(icon_bytes, width=80)  
 
     with col2:
         st.title("BookingJini")
@@ -254,7 +269,12 @@ def main():
         # Upload hotel logo
         uploaded_logo = st.file_uploader("Upload Hotel Logo", type=["png", "jpg", "jpeg"])
         if uploaded_logo is not None:
-            st.session_state.hotel_logo = Image.open(uploaded_logo)
+            # Only reopen the logo when a different file is uploaded, so the
+            # preview cache sees the same logo object across reruns
+            upload_key = (uploaded_logo.name, uploaded_logo.size)
+            if st.session_state.hotel_logo_upload != upload_key:
+                st.session_state.hotel_logo = Image.open(uploaded_logo)
+                st.session_state.hotel_logo_upload = upload_key
             st.image(st.session_state.hotel_logo, width=100)
             
         # API Settings in expander
@@ -272,6 +292,34 @@ def main():
             if st.button("Save API Settings"):
                 st.success("Settings saved successfully!")
 
+        if SHOW_ADMIN_PANEL:
+            with st.expander("Admin: Performance"):
+                summary = metrics_summary()
+                if summary:
+                    st.table([{
+                        "Stage": stage,
+                        "Calls": row["calls"],
+                        "Errors": row["errors"],
+                        "p50 (ms)": f"{row['p50_ms']:.0f}",
+                        "p95 (ms)": f"{row['p95_ms']:.0f}",
+                        "p99 (ms)": f"{row['p99_ms']:.0f}",
+                        "Avg size (KB)": "-" if row["mean_payload_kb"] is None else f"{row['mean_payload_kb']:.1f}",
+                        "Cache hits": "-" if row["cache_hit_rate"] is None else f"{row['cache_hit_rate']:.0%}",
+                    } for stage, row in summary.items()])
+                else:
+                    st.caption("No requests recorded yet.")
+                st.download_button("Download metrics (Prometheus)", data=metrics_text(),
+                                    file_name="bookingjini_metrics.prom", mime="text/plain")
+
+        # Shared Groq/Stability queues; a growing backlog means the rate limits are saturated
+        load = rate_limit_stats()
+        busy = {provider: stats for provider, stats in load.items() if stats["queued"] or stats["paused_for"]}
+        if busy:
+            with st.expander("API Load", expanded=True):
+                for provider, stats in busy.items():
+                    st.caption(f"{provider.capitalize()}: {stats['queued']} request(s) queued, "
+                               f"avg wait {stats['mean_wait']:.1f}s")
+
     # Main content area
     tabs = st.tabs(["Create Post", "Preview & Edit", "Publish"])
 
@@ -329,35 +377,14 @@ def main():
             if has_special_offer:
                 special_offer = st.text_input("Special Offer Details", "20% off for bookings made this week!")
 
+            # Several candidate images and taglines, each from a single request
+            variant_count = st.number_input("Variants to choose from", min_value=1, max_value=MAX_VARIANTS,
+                                            value=1, step=1, key="variant_count")
+
             # Generate Post button
             if st.button("Generate Post", use_container_width=True):
                 with st.spinner("Creating your perfect post..."):
-                    feature_text = ", ".join(features) if features else "our wonderful amenities"
-
-                    text_prompt = f"""
-                    Create a short, engaging social media post (max 100 words) for {hotel_name} in {hotel_location} 
-                    promoting a {occasion}. Target audience: {audience}. 
-                    Highlight these features: {feature_text}.
-                    {"Include this special offer: " + special_offer if has_special_offer else ""}
-                    The tone should be professional yet warm and inviting.
-                    """
-
-                    image_prompt = f"""
-                    {image_style}. 
-                    A beautiful view of a {hotel_type} hotel for a {occasion} promotion, 
-                    {"featuring " + ", ".join(features[:3]) if features and len(features) > 0 else ""}
-                    Perfect for {audience}. No text on the image.
-                    """
-
-                    if use_custom_text:
-                        st.session_state.generated_text = custom_text
-                    else:
-                        st.session_state.generated_text = generate_text_with_llama(text_prompt)
-
-                    st.session_state.generated_image = generate_image_with_stability(image_prompt)
-                    st.session_state.generated_tagline = generate_promotional_tagline(hotel_name, occasion, audience)
-
-                    st.session_state.design_context = {
+                    design_context = {
                         "hotel_name": hotel_name,
                         "hotel_location": hotel_location,
                         "hotel_type": hotel_type,
@@ -368,6 +395,51 @@ def main():
                         "image_style": image_style
                     }
 
+                    # Image and tagline run in the background while the
+                    # caption streams onto the page token by token. In
+                    # combined mode the tagline comes with the caption.
+                    caption_prompt = build_caption_prompt(design_context)
+                    image_prompt = build_image_prompt(design_context)
+                    tagline_context = (hotel_name, occasion, audience)
+                    combined = CAPTION_TAGLINE_COMBINED and not use_custom_text and variant_count == 1
+                    pending = start_post_content(
+                        image_prompt=image_prompt,
+                        tagline_context=None if combined else tagline_context,
+                        variants=variant_count
+                    )
+
+                    caption_stats = {}
+                    if use_custom_text:
+                        st.session_state.generated_text = custom_text
+                    else:
+                        caption_stream = (stream_caption_and_tagline(caption_prompt, tagline_context, caption_stats)
+                                          if combined else stream_text_with_llama(caption_prompt, caption_stats))
+                        st.session_state.generated_text = st.write_stream(caption_stream).strip()
+                        st.session_state.caption_stats = caption_stats
+
+                    content = finish_post_content(pending)
+                    if combined:
+                        content["tagline"] = caption_stats["tagline"]
+                    for message in content["errors"].values():
+                        st.error(message)
+
+                    log_event("generate", design_context,
+                              prompts={"caption": None if use_custom_text else caption_prompt,
+                                       "image": image_prompt,
+                                       "tagline": f"{hotel_name} / {occasion} / {audience}"},
+                              content=content,
+                              timings={"caption": caption_stats.get("total")},
+                              sizes={"text": len(st.session_state.generated_text.encode("utf-8"))},
+                              caption_mode=caption_stats.get("mode", "custom"), variants=variant_count)
+
+                    st.session_state.generated_image = content["image"]
+                    st.session_state.generated_tagline = content["tagline"]
+                    st.session_state.image_variants = content.get("image_variants", [])
+                    st.session_state.variant_thumbnails = variant_thumbnails(st.session_state.image_variants)
+                    st.session_state.tagline_variants = content.get("tagline_variants", [])
+
+                    st.session_state.design_context = design_context
+
                     change_tab(1)
                     st.rerun()
 
@@ -385,8 +457,11 @@ def main():
                 if hasattr(st.session_state, 'design_context'):
                     context = st.session_state.design_context
                     
-                    composite_image = apply_layout(
-                        st.session_state.generated_image.copy(),
+                    # A small render for editing, served from the session's preview
+                    # cache while unchanged; full resolution is only made for export
+                    preview_jpeg, cached = render_preview(
+                        st.session_state.preview_cache,
+                        st.session_state.generated_image,
                         st.session_state.generated_tagline,
                         context.get("layout", "Festive Diya"),  # Use selected layout
                         [context.get("text_color", "#FFFFFF")],  # Use selected text color
@@ -395,12 +470,21 @@ def main():
                         font_large_size=context.get("font_size", 50)  # Use selected font size
                     )
 
-                    st.image(composite_image, use_column_width=True)
-
-                    temp_img_path = "temp_post_image.jpg"
-                    # Convert RGBA to RGB before saving as JPEG
-                    composite_image.convert('RGB').save(temp_img_path)
-                    st.session_state.final_image_path = temp_img_path
+                    st.image(preview_jpeg, use_column_width=True, output_format="JPEG")
+
+                    # Candidate images from variant mode
+                    if len(st.session_state.image_variants) > 1:
+                        st.markdown("#### Choose an Image")
+                        for index, (column, thumbnail) in enumerate(
+                                zip(st.columns(len(st.session_state.variant_thumbnails)),
+                                    st.session_state.variant_thumbnails)):
+                            with column:
+                                st.image(thumbnail, use_column_width=True)
+                                selected = st.session_state.image_variants[index] is st.session_state.generated_image
+                                if st.button("Selected" if selected else "Use", key=f"use_image_{index}",
+                                             disabled=selected, use_container_width=True):
+                                    st.session_state.generated_image = st.session_state.image_variants[index]
+                                    st.rerun()
                 else:
                     st.warning("Please generate content first in the 'Create Post' tab.")
 
@@ -422,39 +506,81 @@ def main():
                             Perfect for {context["audience"]}. No text on the image.
                             """
 
-                            st.session_state.generated_image = generate_image_with_stability(image_prompt)
+                            # The user asked for a new image, so skip the image cache
+                            start = time.perf_counter()
+                            variants = st.session_state.get("variant_count", 1)
+                            if variants > 1:
+                                images = generate_image_variants(image_prompt, variants, use_cache=False)
+                                st.session_state.image_variants = images
+                                st.session_state.variant_thumbnails = variant_thumbnails(images)
+                                st.session_state.generated_image = images[0] if images else None
+                            else:
+                                st.session_state.generated_image = generate_image_with_stability(image_prompt, use_cache=False)
+                                st.session_state.image_variants = []
+                                st.session_state.variant_thumbnails = []
+                            image = st.session_state.generated_image
+                            log_event("regenerate_image", context, prompts={"image": image_prompt},
+                                      timings={"image": time.perf_counter() - start},
+                                      sizes={"image": list(image.size) if image is not None else None},
+                                      errors=None if image is not None else {"image": "Image generation failed"})
                             st.rerun()
 
                 # Text editing section
                 with st.expander("Text Content", expanded=True):
                     # Caption editing
+                    caption_stream_area = st.empty()
                     caption_height = min(150, max(68, len(st.session_state.generated_text.split('\n')) * 25))
                     edited_text = st.text_area("Edit Caption", st.session_state.generated_text, height=caption_height)
                     st.session_state.generated_text = edited_text
+
+                    caption_stats = st.session_state.caption_stats
+                    if caption_stats.get("ttft") is not None:
+                        st.caption(f"Caption: first token after {caption_stats['ttft']:.2f}s, "
+                                   f"complete after {caption_stats.get('total', caption_stats['ttft']):.2f}s "
+                                   f"({caption_stats.get('mode', 'stream')})")
                     
                     if st.button("Regenerate Caption", key="regenerate_caption"):
                         with st.spinner("Generating new caption..."):
                             if hasattr(st.session_state, 'design_context'):
                                 context = st.session_state.design_context
 
-                                feature_text = ", ".join(context["features"]) if context[
-                                    "features"] else "our wonderful amenities"
-
-                                text_prompt = f"""
-                                Create a short, engaging social media post (max 100 words) for {context["hotel_name"]} in {context["hotel_location"]} 
-                                promoting a {context["occasion"]}. Target audience: {context["audience"]}. 
-                                Highlight these features: {feature_text}.
-                                {"Include this special offer: " + context["special_offer"] if context["special_offer"] else ""}
-                                The tone should be professional yet warm and inviting.
-                                """
-
-                                # Generate new text and tagline
-                                st.session_state.generated_text = generate_text_with_llama(text_prompt)
-                                st.session_state.generated_tagline = generate_promotional_tagline(
-                                    context["hotel_name"], 
-                                    context["occasion"], 
-                                    context["audience"]
+                                # The tagline runs in the background while the
+                                # new caption streams into the caption area, or
+                                # comes with the caption in combined mode
+                                tagline_context = (context["hotel_name"], context["occasion"], context["audience"])
+                                variants = st.session_state.get("variant_count", 1)
+                                combined = CAPTION_TAGLINE_COMBINED and variants == 1
+                                pending = start_post_content(
+                                    tagline_context=None if combined else tagline_context,
+                                    variants=variants
                                 )
+                                caption_stats = {}
+                                caption_prompt = build_caption_prompt(context)
+                                with caption_stream_area.container():
+                                    generated_text = st.write_stream(
+                                        stream_caption_and_tagline(caption_prompt, tagline_context, caption_stats)
+                                        if combined else
+                                        stream_text_with_llama(caption_prompt, caption_stats)
+                                    )
+                                content = finish_post_content(pending)
+                                if combined:
+                                    content["tagline"] = caption_stats["tagline"]
+                                for message in content["errors"].values():
+                                    st.error(message)
+
+                                log_event("regenerate_caption", context,
+                                          prompts={"caption": caption_prompt,
+                                                   "tagline": f"{context['hotel_name']} / {context['occasion']} / "
+                                                              f"{context['audience']}"},
+                                          content=content,
+                                          timings={"caption": caption_stats.get("total")},
+                                          sizes={"text": len(generated_text.strip().encode("utf-8"))},
+                                          caption_mode=caption_stats.get("mode"))
+
+                                st.session_state.generated_text = generated_text.strip()
+                                st.session_state.caption_stats = caption_stats
+                                st.session_state.generated_tagline = content["tagline"]
+                                st.session_state.tagline_variants = content.get("tagline_variants", [])
                                 
                                 # Update the context
                                 context["text"] = st.session_state.generated_text
@@ -462,6 +588,14 @@ def main():
                                 
                                 st.rerun()
 
+                    # Candidate taglines from variant mode; picking one replaces the tagline below
+                    if len(st.session_state.tagline_variants) > 1:
+                        def use_tagline_variant():
+                            st.session_state.generated_tagline = st.session_state.tagline_choice
+
+                        st.radio("Choose a Tagline", st.session_state.tagline_variants, key="tagline_choice",
+                                 on_change=use_tagline_variant)
+
                     # Tagline editing
                     tagline_height = min(150, max(68, len(st.session_state.generated_tagline.split('\n')) * 30))
                     edited_tagline = st.text_area("Promotional Tagline", st.session_state.generated_tagline, height=tagline_height)
@@ -473,11 +607,19 @@ def main():
                                 context = st.session_state.design_context
                                 
                                 # Generate new tagline only
-                                st.session_state.generated_tagline = generate_promotional_tagline(
-                                    context["hotel_name"], 
-                                    context["occasion"], 
-                                    context["audience"]
-                                )
+                                variants = st.session_state.get("variant_count", 1)
+                                if variants > 1:
+                                    st.session_state.tagline_variants = generate_tagline_variants(
+                                        context["hotel_name"], context["occasion"], context["audience"], variants
+                                    )
+                                    st.session_state.generated_tagline = st.session_state.tagline_variants[0]
+                                else:
+                                    st.session_state.tagline_variants = []
+                                    st.session_state.generated_tagline = generate_promotional_tagline(
+                                        context["hotel_name"], 
+                                        context["occasion"], 
+                                        context["audience"]
+                                    )
                                 
                                 # Update the context
                                 context["tagline"] = st.session_state.generated_tagline
@@ -527,9 +669,36 @@ def main():
     with tabs[2]:
         st.header("Publish Your Post")
 
-        if hasattr(st.session_state, 'final_image_path') and st.session_state.final_image_path is not None and os.path.exists(st.session_state.final_image_path):
+        final_preview = st.session_state.preview_cache.get("preview")
+        if final_preview is not None:
             st.subheader("Ready to Publish")
-            st.image(st.session_state.final_image_path)
+
+            context = st.session_state.design_context or {}
+
+            def platform_renditions(platform_names):
+                # Cropped and re-laid-out per platform, kept in the session assets until the design changes
+                return render_renditions(
+                    st.session_state.assets,
+                    st.session_state.generated_image,
+                    st.session_state.generated_tagline,
+                    context.get("layout", "Festive Diya"),
+                    [context.get("text_color", "#FFFFFF")],
+                    context.get("font", "Arial"),
+                    st.session_state.hotel_logo,
+                    font_large_size=context.get("font_size", 50),
+                    platforms=platform_names
+                )
+
+            preview_for = st.radio("Preview for", ["Original", "Instagram", "Facebook", "Twitter", "LinkedIn"],
+                                   horizontal=True)
+            if preview_for == "Original":
+                shown_image = final_preview
+            else:
+                with st.spinner(f"Rendering {preview_for} version..."):
+                    shown_image = platform_renditions([preview_for.lower()])[preview_for.lower()]
+                width, height = PLATFORM_RENDITIONS[preview_for.lower()]
+                st.caption(f"{preview_for}: {width} x {height}")
+            st.image(shown_image, output_format="JPEG")
             st.write("**Caption:**")
             st.write(st.session_state.generated_text)
 
@@ -542,16 +711,39 @@ def main():
                 "LinkedIn": st.checkbox("LinkedIn")
             }
 
-            schedule_post = st.checkbox("Schedule for later")
+            schedule_later = st.checkbox("Schedule for later")
             scheduled_time = None
 
-            if schedule_post:
+            if schedule_later:
                 scheduled_date = st.date_input("Select date", datetime.now().date())
                 scheduled_time = st.time_input("Select time", datetime.now().time())
 
                 if st.button("Schedule Post"):
+                    selected_platforms = [p for p, selected in platforms.items() if selected]
                     scheduled_datetime = datetime.combine(scheduled_date, scheduled_time)
-                    st.success(f"Post scheduled for {scheduled_datetime.strftime('%B %d, %Y at %I:%M %p')}")
+
+                    if not selected_platforms:
+                        st.warning("Please select at least one platform to schedule.")
+                    else:
+                        renditions = platform_renditions([p.lower() for p in selected_platforms])
+                        job_id = schedule_post(st.session_state.generated_text, renditions, scheduled_datetime)
+                        log_event("schedule", context,
+                                  sizes={platform: len(data) for platform, data in renditions.items()},
+                                  errors=None if job_id is not None else {"schedule": "Could not queue the post"},
+                                  job_id=job_id, due_at=scheduled_datetime.timestamp(),
+                                  platforms=[p.lower() for p in selected_platforms])
+                        if job_id is not None:
+                            st.success(f"Post scheduled for {scheduled_datetime.strftime('%B %d, %Y at %I:%M %p')}")
+
+                scheduled_jobs = scheduled_posts()
+                if scheduled_jobs:
+                    with st.expander(f"Scheduled Posts ({len(scheduled_jobs)})"):
+                        for job in scheduled_jobs:
+                            due = datetime.fromtimestamp(job["due_at"]).strftime('%B %d, %Y at %I:%M %p')
+                            platforms_text = ", ".join(p.capitalize() for p in job["platforms"])
+                            st.write(f"**{due}** - {platforms_text} ({job['status']})")
+                            if job["last_error"]:
+                                st.caption(job["last_error"])
             else:
                 if st.button("Publish Now"):
                     selected_platforms = [p for p, selected in platforms.items() if selected]
@@ -560,12 +752,30 @@ def main():
                         st.warning("Please select at least one platform to publish to.")
                     else:
                         with st.spinner(f"Publishing to {', '.join(selected_platforms)}..."):
+                            # All selected platform sizes are rendered in parallel
+                            renditions = platform_renditions([p.lower() for p in selected_platforms])
                             success_count = 0
-                            for platform in selected_platforms:
-                                if post_to_social_media(platform.lower(), st.session_state.final_image_path,
-                                                        st.session_state.generated_text):
+                            publish_start = time.perf_counter()
+                            results = []
+                            # Platforms are posted to concurrently; results arrive as each one finishes
+                            for result in publish_to_platforms(renditions, st.session_state.generated_text):
+                                results.append(result)
+                                name = result["platform"].capitalize()
+                                if result["ok"]:
                                     success_count += 1
-                                    time.sleep(0.5)  # Simulate API call
+                                    suffix = " (simulation)" if result["post_id"] == "simulated" else ""
+                                    st.success(f"Post successfully shared to {name}!{suffix} "
+                                               f"({result['elapsed']:.1f}s)")
+                                else:
+                                    st.warning(result["error"])
+
+                            log_event("publish", context,
+                                      timings={"publish": time.perf_counter() - publish_start,
+                                               **{r["platform"]: r["elapsed"] for r in results}},
+                                      sizes={platform: len(data) for platform, data in renditions.items()},
+                                      errors={r["platform"]: r["error"] for r in results if not r["ok"]},
+                                      platforms=[{key: r[key] for key in ("platform", "ok", "attempts", "post_id")}
+                                                 for r in results])
 
                             if success_count == len(selected_platforms):
                                 st.balloons()
@@ -574,12 +784,33 @@ def main():
                                 st.warning(
                                     f"Published to {success_count} out of {len(selected_platforms)} platforms. Check settings for errors.")
 
-            st.download_button(
-                label="Download Image",
-                data=open(st.session_state.final_image_path, "rb").read(),
-                file_name=f"hotel_post_{datetime.now().strftime('%Y%m%d')}.jpg",
-                mime="image/jpeg"
-            )
+            if preview_for == "Original":
+                # The preview is low resolution; the full-size post is composited
+                # only when asked for, then kept in the session assets until the
+                # design changes
+                export_args = (st.session_state.assets,
+                               st.session_state.generated_image,
+                               st.session_state.generated_tagline,
+                               context.get("layout", "Festive Diya"),
+                               [context.get("text_color", "#FFFFFF")],
+                               context.get("font", "Arial"),
+                               st.session_state.hotel_logo)
+                download_data = render_export(*export_args, font_large_size=context.get("font_size", 50),
+                                              render=False)
+                if download_data is None and st.button("Prepare Full-Resolution Image"):
+                    with st.spinner("Rendering full resolution..."):
+                        download_data = render_export(*export_args, font_large_size=context.get("font_size", 50))
+            else:
+                download_data = shown_image
+
+            if download_data is not None:
+                st.download_button(
+                    label="Download Image" if preview_for == "Original" else f"Download {preview_for} Image",
+                    data=download_data,
+                    file_name=(f"hotel_post_{datetime.now().strftime('%Y%m%d')}.jpg" if preview_for == "Original"
+                               else f"hotel_post_{preview_for.lower()}_{datetime.now().strftime('%Y%m%d')}.jpg"),
+                    mime="image/jpeg"
+                )
 
             if st.button("Copy Caption to Clipboard"):
                 st.code(st.session_state.generated_text)
@@ -0,0 +1,247 @@
+"""In-process metrics for the backend stages, exported in Prometheus format.
+
+Each stage (tagline, caption, image, apply_layout, jpeg_encode, publish)
+records its latency, errors, payload size and, where it has one, whether
+its cache answered:
+
+    with metrics.track("caption") as sample:
+        caption = ...
+        sample["payload_bytes"] = len(caption.encode("utf-8"))
+        sample["cache_hit"] = False
+
+Latency and payload sizes go into cumulative Prometheus histograms. The
+most recent samples per stage are also kept so summary() can report exact
+p50/p95/p99 for the admin panel. prometheus_text() renders everything,
+including gauges from registered collectors (cache and queue stats), and
+can be served over HTTP with serve_metrics() or written to a file for the
+node_exporter textfile collector with write_metrics_file().
+"""
+import functools
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(8))  # 1 KiB .. 16 MiB
+RECENT_SAMPLES = 1000
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, as Prometheus expects."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total, rows = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            rows.append((repr(float(bound)), total))
+        rows.append(("+Inf", self.count))
+        return rows
+
+
+class StageMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.payload = Histogram(SIZE_BUCKETS)
+        self.errors = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class MetricsRegistry:
+    """Thread-safe per-stage metrics shared by every session in the process."""
+
+    def __init__(self, prefix: str = "bookingjini"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageMetrics] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def observe(self, stage: str, seconds: float, error: bool = False,
+                payload_bytes: Optional[int] = None, cache_hit: Optional[bool] = None):
+        with self._lock:
+            metrics = self._stages.get(stage)
+            if metrics is None:
+                metrics = self._stages[stage] = StageMetrics()
+            metrics.latency.observe(seconds)
+            metrics.recent.append(seconds)
+            if error:
+                metrics.errors += 1
+            if payload_bytes is not None:
+                metrics.payload.observe(payload_bytes)
+            if cache_hit is True:
+                metrics.cache_hits += 1
+            elif cache_hit is False:
+                metrics.cache_misses += 1
+
+    @contextmanager
+    def track(self, stage: str) -> Iterator[Dict]:
+        """Time the block as one call of ``stage``; exceptions count as errors.
+
+        The yielded dict can be given "payload_bytes" and "cache_hit".
+        """
+        sample = {}
+        start = time.perf_counter()
+        try:
+            yield sample
+        except BaseException:
+            self.observe(stage, time.perf_counter() - start, error=True, payload_bytes=sample.get("payload_bytes"),
+                         cache_hit=sample.get("cache_hit"))
+            raise
+        self.observe(stage, time.perf_counter() - start, error=sample.get("error", False),
+                     payload_bytes=sample.get("payload_bytes"), cache_hit=sample.get("cache_hit"))
+
+    def timed(self, stage: str) -> Callable:
+        """Decorator form of track() for functions with nothing else to record."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.track(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_collector(self, name: str, collect: Callable[[], Dict[str, float]]):
+        """Export collect()'s values as gauges named <prefix>_<name>_<key>.
+
+        Keys may carry labels as "key{label=\"value\"}".
+        """
+        with self._lock:
+            self._collectors[name] = collect
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage calls, errors, p50/p95/p99 (ms), mean payload and cache hit rate."""
+        with self._lock:
+            stages = {name: (m.latency.count, m.errors, sorted(m.recent), m.payload.count, m.payload.sum,
+                             m.cache_hits, m.cache_misses) for name, m in self._stages.items()}
+        summary = {}
+        for name, (calls, errors, recent, payloads, payload_sum, hits, misses) in sorted(stages.items()):
+            summary[name] = {
+                "calls": calls,
+                "errors": errors,
+                "p50_ms": _percentile(recent, 50) * 1000,
+                "p95_ms": _percentile(recent, 95) * 1000,
+                "p99_ms": _percentile(recent, 99) * 1000,
+                "mean_payload_kb": payload_sum / payloads / 1024 if payloads else None,
+                "cache_hit_rate": hits / (hits + misses) if hits + misses else None,
+            }
+        return summary
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_duration_seconds Latency of each backend stage.",
+            f"# TYPE {p}_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for name, m in stages:
+                for bound, count in m.latency.cumulative():
+                    lines.append(f'{p}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'{p}_stage_duration_seconds_sum{{stage="{name}"}} {m.latency.sum}')
+                lines.append(f'{p}_stage_duration_seconds_count{{stage="{name}"}} {m.latency.count}')
+
+            lines += [f"# HELP {p}_stage_payload_bytes Size of each stage's response or output.",
+                      f"# TYPE {p}_stage_payload_bytes histogram"]
+            for name, m in stages:
+                if not m.payload.count:
+                    continue
+                for bound, count in m.payload.cumulative():
+                    lines.append(f'{p}_stage_payload_bytes_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'{p}_stage_payload_bytes_sum{{stage="{name}"}} {m.payload.sum}')
+                lines.append(f'{p}_stage_payload_bytes_count{{stage="{name}"}} {m.payload.count}')
+
+            for metric, help_text, attribute in (
+                    ("stage_errors_total", "Failed calls per stage.", "errors"),
+                    ("stage_cache_hits_total", "Calls answered from a cache.", "cache_hits"),
+                    ("stage_cache_misses_total", "Calls that missed the cache.", "cache_misses")):
+                lines += [f"# HELP {p}_{metric} {help_text}", f"# TYPE {p}_{metric} counter"]
+                lines += [f'{p}_{metric}{{stage="{name}"}} {getattr(m, attribute)}' for name, m in stages]
+            collectors = list(self._collectors.items())
+
+        typed = set()
+        for name, collect in collectors:
+            try:
+                values = collect()
+            except Exception:
+                continue
+            for key, value in values.items():
+                if value is None:
+                    continue
+                base, _, labels = key.partition("{")
+                metric = f"{p}_{name}_{base}"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric}{'{' + labels if labels else ''} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path: str, registry: "MetricsRegistry"):
+    """Atomically write the Prometheus text to ``path`` (textfile collector)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(registry.prometheus_text())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def serve_metrics(port: int, registry: "MetricsRegistry", host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve GET /metrics on ``port`` from a daemon thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="bookingjini-metrics", daemon=True).start()
+    return server
+
+
+# Process-wide registry used by the backend
+metrics = MetricsRegistry()
@@ -0,0 +1,229 @@
+"""Local stand-in for the Groq, Stability and social media publishing APIs.
+
+    python mock_api.py --port 8765 --latency 0.3 --fail-rate 0.1
+
+then point the app at it (in .streamlit/secrets.toml or the environment):
+
+    SOCIAL_API_BASE_URL = "http://127.0.0.1:8765/social"
+    GROQ_BASE_URL = "http://127.0.0.1:8765"
+    STABILITY_BASE_URL = "http://127.0.0.1:8765"
+
+``POST /social/<platform>/posts`` answers ``{"id": ..., "platform": ...}``.
+``POST /openai/v1/chat/completions`` answers a chat completion (streamed as
+server-sent events when the request sets "stream"; a JSON caption and
+tagline, or a list of taglines, when the request asks for a JSON object), and
+``POST /v1/generation/<engine>/text-to-image`` answers a noise PNG of the
+requested size, raw or base64 in JSON depending on the Accept header.
+
+Every response is delayed by ``--latency`` seconds. A ``--fail-rate`` share
+of requests get a 503, and requests beyond ``--rate-limit`` per route per
+second get a 429 with a Retry-After header, so retries and rate limiting
+can be tried locally. ``GET /stats`` returns the per-route request counts.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from PIL import Image
+
+CAPTION_WORDS = ("Celebrate the festival of lights with us, where heritage meets warm hospitality. "
+                 "Unwind by the pool, indulge at the spa and savour festive feasts with your family. "
+                 "Book now and make memories that glow long after the diyas fade.").split()
+
+
+@lru_cache(maxsize=8)
+def noise_png(width: int, height: int) -> bytes:
+    """Random-noise PNG, about as large as a real photo of the same size."""
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (width, height), os.urandom(width * height * 3)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, fail_rate: float = 0.0,
+                 rate_limit: Optional[float] = None):
+        super().__init__(address, MockAPIHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self._windows: Dict[str, list] = {}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, route: str, outcome: str):
+        with self.lock:
+            counts = self.counts.setdefault(route, {"ok": 0, "failed": 0, "throttled": 0})
+            counts[outcome] += 1
+
+    def throttled(self, route: str) -> bool:
+        """True if ``route`` already had rate_limit requests in the last second."""
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            window = [t for t in self._windows.get(route, []) if t > now - 1.0]
+            self._windows[route] = window
+            if len(window) >= self.rate_limit:
+                return True
+            window.append(now)
+            return False
+
+    def start(self) -> threading.Thread:
+        """Serve from a daemon thread; returns the thread."""
+        thread = threading.Thread(target=self.serve_forever, name="mock-api", daemon=True)
+        thread.start()
+        return thread
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, keep-alive
+    # responses would add ~40ms of delayed-ACK stall to every request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.server.lock:
+                self._send_json(200, self.server.counts)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        body = self._read_body()
+        if len(parts) == 3 and parts[0] == "social" and parts[2] == "posts":
+            route, handler = parts[1], self._social_post
+        elif self.path == "/openai/v1/chat/completions":
+            route, handler = "groq", self._chat_completion
+        elif len(parts) == 4 and parts[:2] == ["v1", "generation"] and parts[3] == "text-to-image":
+            route, handler = "stability", self._text_to_image
+        else:
+            self._send_json(404, {"error": "not found"})
+            return
+
+        server = self.server
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self._send_json(401, {"error": "missing token"})
+            return
+        if server.throttled(route):
+            server.record(route, "throttled")
+            self._send_json(429, {"error": "rate limited"}, {"Retry-After": "1"})
+            return
+        time.sleep(server.latency)
+        if random.random() < server.fail_rate:
+            server.record(route, "failed")
+            self._send_json(503, {"error": "temporarily unavailable"})
+            return
+        server.record(route, "ok")
+        handler(route, body)
+
+    def _social_post(self, platform: str, body: bytes):
+        self._send_json(201, {"id": f"{platform}-{int(time.time() * 1000)}-{random.randrange(10000)}",
+                              "platform": platform, "bytes": len(body)})
+
+    def _chat_completion(self, route: str, body: bytes):
+        request = json.loads(body or b"{}")
+        words = random.sample(CAPTION_WORDS, min(len(CAPTION_WORDS), int(request.get("max_tokens", 150)) // 2))
+        content = " ".join(words)
+        if self._wants_json(request):
+            if any('"taglines"' in message.get("content", "") for message in request.get("messages", [])):
+                count = max(1, int(request.get("max_tokens", 20)) // 20)
+                content = json.dumps({"taglines": [" ".join(random.sample(CAPTION_WORDS, 6)) for _ in range(count)]})
+            else:
+                content = json.dumps({"tagline": " ".join(random.sample(CAPTION_WORDS, 6)), "caption": content})
+            # Stream the JSON in small pieces, as a model would
+            words = [content[i:i + 8] for i in range(0, len(content), 8)]
+        else:
+            words = [word + " " for word in words]
+        usage = {"prompt_tokens": len(body) // 4, "completion_tokens": len(words)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if not request.get("stream"):
+            self._send_json(200, {"choices": [{"message": {"role": "assistant", "content": content}}],
+                                  "usage": usage})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [{"choices": [{"delta": {"content": word}}]} for word in words]
+        for event in [json.dumps(event) for event in events] + ["[DONE]"]:
+            data = f"data: {event}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    @staticmethod
+    def _wants_json(request: Dict) -> bool:
+        """JSON mode, or a streamed request whose prompt asks for a JSON object."""
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            return True
+        return any("JSON object" in message.get("content", "") for message in request.get("messages", []))
+
+    def _text_to_image(self, route: str, body: bytes):
+        request = json.loads(body or b"{}")
+        png = noise_png(int(request.get("width", 1024)), int(request.get("height", 1024)))
+        if self.headers.get("Accept") == "image/png":
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(png)))
+            self.end_headers()
+            self.wfile.write(png)
+            return
+        artifact = {"base64": base64.b64encode(png).decode("ascii"), "finishReason": "SUCCESS"}
+        self._send_json(200, {"artifacts": [artifact] * int(request.get("samples", 1))})
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local stand-in for the BookingJini API providers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before each response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--rate-limit", type=float, default=None, help="requests per second per route before 429")
+    args = parser.parse_args(argv)
+
+    server = MockAPIServer((args.host, args.port), latency=args.latency, fail_rate=args.fail_rate,
+                           rate_limit=args.rate_limit)
+    print(f"Mock API listening on {server.url} (SOCIAL_API_BASE_URL = \"{server.url}/social\", "
+          f"GROQ_BASE_URL = STABILITY_BASE_URL = \"{server.url}\")", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at ``rate_per_minute``.
+
+    Up to ``burst`` tokens can be spent at once; after that acquire() blocks
+    until enough tokens have been refilled.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, rate_per_minute / 60.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, tokens: float = 1, now: Optional[float] = None) -> float:
+        """Seconds until ``tokens`` are available, without taking them."""
+        with self._lock:
+            self._refill(time.monotonic() if now is None else now)
+            if self._tokens >= tokens:
+                return 0.0
+            if self.rate <= 0:
+                return float("inf")
+            return (tokens - self._tokens) / self.rate
+
+    def take(self, tokens: float):
+        """Spend ``tokens`` unconditionally; the balance may go negative."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Take ``tokens`` if available; otherwise return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            if self.rate <= 0:
+                return float("inf")
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """Block until ``tokens`` are taken; False if ``timeout`` runs out first."""
+        # Never wait for more than the bucket can ever hold
+        tokens = min(tokens, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or wait > remaining:
+                    return False
+            time.sleep(wait)
+
+
+class RateLimitError(Exception):
+    """Raised when a provider stays rate limited or its queue wait runs out."""
+
+
+class ProviderLimiter:
+    """Requests- and tokens-per-minute budget for one API provider.
+
+    One instance is shared by every session in the process. Callers queue
+    per client (a Streamlit session, a batch worker, ...) and clients are
+    served round robin, so one session firing many requests cannot starve
+    the others. After a 429, penalize() pauses the whole queue so waiting
+    callers do not all hit the provider again at once.
+    """
+
+    def __init__(self, name: str, rpm: float, tpm: Optional[float] = None,
+                 burst_seconds: float = 10.0, max_wait: Optional[float] = 120.0):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self.requests = TokenBucket(rpm, burst=max(1.0, rpm * burst_seconds / 60.0))
+        self.tokens = TokenBucket(tpm, burst=max(1.0, tpm * burst_seconds / 60.0)) if tpm else None
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()  # client -> deque of tickets, next client to serve first
+        self._ticket = 0
+        self._paused_until = 0.0
+        self.served = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def _head(self) -> Optional[int]:
+        for tickets in self._queues.values():
+            return tickets[0]
+        return None
+
+    def _wait_time(self, tokens: float) -> float:
+        now = time.monotonic()
+        wait = max(0.0, self._paused_until - now)
+        wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(min(tokens, self.tokens.capacity), now))
+        return wait
+
+    def acquire(self, tokens: float = 0, client: Optional[str] = None) -> float:
+        """Wait for this client's turn and budget; returns the seconds waited.
+
+        ``tokens`` is the estimated prompt + completion size, only used
+        when a tokens-per-minute budget is set. Raises RateLimitError if
+        the wait would exceed max_wait.
+        """
+        start = time.monotonic()
+        deadline = None if self.max_wait is None else start + self.max_wait
+        with self._cond:
+            self._ticket += 1
+            ticket = self._ticket
+            self._queues.setdefault(client, deque()).append(ticket)
+            try:
+                while True:
+                    if self._head() == ticket:
+                        wait = self._wait_time(tokens)
+                        if wait == 0:
+                            break
+                    else:
+                        wait = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or (wait is not None and wait > remaining):
+                            raise RateLimitError(
+                                f"{self.name} is busy (rate limited). Please wait a moment and try again.")
+                        wait = remaining if wait is None else wait
+                    self._cond.wait(wait)
+
+                self.requests.take(1)
+                if self.tokens is not None and tokens:
+                    self.tokens.take(min(tokens, self.tokens.capacity))
+                self.served += 1
+                waited = time.monotonic() - start
+                self.wait_seconds += waited
+                return waited
+            finally:
+                queue = self._queues[client]
+                queue.remove(ticket)
+                del self._queues[client]
+                if queue:
+                    # Round robin: this client's next request goes to the back
+                    self._queues[client] = queue
+                self._cond.notify_all()
+
+    def record_usage(self, estimated: float, actual: float):
+        """Correct the tokens-per-minute budget once real usage is known."""
+        if self.tokens is not None:
+            self.tokens.take(actual - estimated)
+
+    def penalize(self, seconds: float):
+        """Pause the whole queue for ``seconds`` (after a 429 response)."""
+        with self._cond:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return sum(len(tickets) for tickets in self._queues.values())
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "queued": sum(len(tickets) for tickets in self._queues.values()),
+                "clients": len(self._queues),
+                "served": self.served,
+                "throttled": self.throttled,
+                "mean_wait": self.wait_seconds / self.served if self.served else 0.0,
+                "paused_for": max(0.0, self._paused_until - time.monotonic()),
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+            }
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0,
+                  retry_after: Optional[float] = None) -> float:
+    """Jittered delay before retry number ``attempt`` (1-based).
+
+    A server-supplied Retry-After is honoured with up to a second of
+    jitter on top; otherwise "full jitter" exponential backoff is used.
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 1.0)
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
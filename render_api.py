@@ -0,0 +1,489 @@
+"""Headless HTTP API for generating, rendering and publishing posts.
+
+    python render_api.py --port 8080
+
+Endpoints (JSON request bodies; images are base64 strings):
+
+``POST /generate``
+    Hotel context as in batch.py job files ("hotel_name", "occasion",
+    "audience", "features", ...). Answers {"text", "tagline", "image"
+    (base64 PNG), "errors", "timings"}. With "layout" in the body the
+    response also holds "composite", the finished post as base64 JPEG,
+    rendered on the render pool (an error under "composite" if it is full).
+
+``POST /render``
+    {"image", "text", "layout", "font", "font_size", "text_color", "logo",
+    "platform" or "width"/"height", "format" ("jpeg", "png" or "webp"),
+    "quality"}. Runs apply_layout and streams the encoded image back as it
+    is produced (chunked transfer encoding).
+
+``POST /publish``
+    {"caption", "image" or "images" ({platform: image}), "platforms"}.
+    Streams one JSON line per platform as each publish finishes.
+
+``GET /healthz`` reports the pools; ``GET /metrics`` is the backend's
+Prometheus text.
+
+Rendering runs on a pool sized to the CPU count; generation and publishing,
+which mostly wait on the network, have pools of their own. Each pool takes
+at most ``workers + queue`` requests. Beyond that the server answers 503
+with Retry-After straight away, so a load balancer can send the request to
+another instance instead of it queueing here. The service keeps no state
+between requests, so any number of instances can run side by side.
+
+Set RENDER_API_TOKEN (secrets.toml or environment) to require
+``Authorization: Bearer <token>`` on every request except /healthz.
+"""
+import argparse
+import base64
+import binascii
+import io
+import json
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+from backend import (PLATFORM_RENDITIONS,
+                     apply_layout,
+                     build_caption_prompt,
+                     build_image_prompt,
+                     encode_jpeg,
+                     generate_post_content,
+                     get_secret,
+                     log_event,
+                     metrics,
+                     publish_to_platforms,
+                     render_rendition,
+                     start_post_dispatcher)
+
+RENDER_API_TOKEN = get_secret("RENDER_API_TOKEN", "")
+RENDER_API_MAX_BODY_MB = float(get_secret("RENDER_API_MAX_BODY_MB", 20))
+STREAM_CHUNK_SIZE = 64 * 1024
+IMAGE_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "png": ("PNG", "image/png"), "webp": ("WEBP", "image/webp")}
+
+
+class RequestError(Exception):
+    """A bad request; the message is returned to the caller with a 400."""
+
+
+class PoolFull(Exception):
+    """Raised by BoundedPool.submit when the pool has no free slot."""
+
+
+class BoundedPool:
+    """Thread pool that turns work away instead of queueing it without limit.
+
+    At most ``workers`` jobs run and ``queue`` more wait; submit() raises
+    PoolFull when both are taken.
+    """
+
+    def __init__(self, name: str, workers: int, queue: int):
+        self.name = name
+        self.workers = workers
+        self.capacity = workers + queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"render-api-{name}")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, func: Callable, *args) -> Future:
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise PoolFull(self.name)
+            self.in_flight += 1
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"workers": self.workers, "capacity": self.capacity, "in_flight": self.in_flight,
+                    "queued": max(0, self.in_flight - self.workers), "completed": self.completed,
+                    "rejected": self.rejected}
+
+
+class ChunkedWriter:
+    """File-like object that sends each write as an HTTP/1.1 chunk.
+
+    The status line and headers go out with the first write, so a failure
+    before any output can still be answered with an error status.
+    """
+
+    def __init__(self, handler: BaseHTTPRequestHandler, content_type: str):
+        self.handler = handler
+        self.content_type = content_type
+        self.started = False
+        self.bytes_sent = 0
+
+    def write(self, data: bytes) -> int:
+        if not data:
+            return 0
+        if not self.started:
+            self.started = True
+            self.handler.send_response(200)
+            self.handler.send_header("Content-Type", self.content_type)
+            self.handler.send_header("Transfer-Encoding", "chunked")
+            self.handler.end_headers()
+        self.handler.wfile.write(f"{len(data):x}\r\n".encode("ascii") + bytes(data) + b"\r\n")
+        self.bytes_sent += len(data)
+        return len(data)
+
+    def flush(self):
+        self.handler.wfile.flush()
+
+    def close(self):
+        """Send the terminating chunk (nothing is sent if nothing was written)."""
+        if self.started:
+            self.handler.wfile.write(b"0\r\n\r\n")
+            self.handler.wfile.flush()
+
+
+def _decode_image(data: Optional[str], field: str, mode: Optional[str] = None) -> Optional[Image.Image]:
+    if not data:
+        return None
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(data, validate=True)))
+        image.load()
+    except (binascii.Error, UnidentifiedImageError, OSError, ValueError) as e:
+        raise RequestError(f'"{field}" is not a base64-encoded image: {e}')
+    return image.convert(mode) if mode and image.mode != mode else image
+
+
+def _encode_png(image: Image.Image) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def _design(body: Dict) -> Dict:
+    """apply_layout arguments from a request body."""
+    try:
+        font_size = int(body.get("font_size", 50))
+    except (TypeError, ValueError):
+        raise RequestError('"font_size" must be an integer')
+    return {
+        "text": str(body.get("text", body.get("tagline", ""))),
+        "layout_style": body.get("layout", "Festive Diya"),
+        "colors": [body.get("text_color", "#FFFFFF")],
+        "font_name": body.get("font", "Arial"),
+        "logo": _decode_image(body.get("logo"), "logo", "RGBA"),
+        "font_large_size": max(10, min(font_size, 400)),
+    }
+
+
+def _quality(body: Dict, image_format: str) -> int:
+    try:
+        quality = int(body.get("quality", 90))
+    except (TypeError, ValueError):
+        raise RequestError('"quality" must be an integer')
+    # Pillow advises against JPEG quality above 95
+    return max(1, min(quality, 100 if image_format == "WEBP" else 95))
+
+
+def _render(body: Dict) -> Image.Image:
+    image = _decode_image(body.get("image"), "image")
+    if image is None:
+        raise RequestError('"image" is required')
+    design = _design(body)
+
+    size = None
+    if body.get("platform"):
+        size = PLATFORM_RENDITIONS.get(str(body["platform"]).lower())
+        if size is None:
+            raise RequestError(f'unknown platform "{body["platform"]}"; expected one of {sorted(PLATFORM_RENDITIONS)}')
+    elif body.get("width") or body.get("height"):
+        try:
+            size = (int(body.get("width") or image.width), int(body.get("height") or image.height))
+        except (TypeError, ValueError):
+            raise RequestError('"width" and "height" must be integers')
+        if not (16 <= size[0] <= 8192 and 16 <= size[1] <= 8192):
+            raise RequestError('"width" and "height" must be between 16 and 8192')
+
+    if size is None or size == image.size:
+        return apply_layout(image, **design)
+    return render_rendition(image, size, **design)
+
+
+def _render_job(body: Dict, writer: ChunkedWriter):
+    """Render and encode straight into the response, on a render worker."""
+    output = str(body.get("format", "jpeg")).lower()
+    if output not in IMAGE_FORMATS:
+        raise RequestError(f'"format" must be one of {sorted(IMAGE_FORMATS)}')
+    image_format, _ = IMAGE_FORMATS[output]
+    options = {"quality": _quality(body, image_format)} if image_format != "PNG" else {"compress_level": 1}
+    with metrics.track("api_render") as sample:
+        composite = _render(body)
+        if image_format != "PNG" and composite.mode != "RGB":
+            composite = composite.convert("RGB")
+        # The encoder writes its output in blocks, each sent as one chunk
+        composite.save(writer, format=image_format, **options)
+        sample["payload_bytes"] = writer.bytes_sent
+    writer.close()
+
+
+def _generate_job(body: Dict, client: str) -> Tuple[Dict, Optional[Image.Image]]:
+    """Generate the post on an I/O worker; returns the response and the raw image."""
+    context = {
+        "hotel_name": body.get("hotel_name", ""),
+        "hotel_location": body.get("hotel_location", ""),
+        "hotel_type": body.get("hotel_type", "Luxury"),
+        "occasion": body.get("occasion", ""),
+        "audience": body.get("audience", "General"),
+        "features": list(body.get("features", [])),
+        "special_offer": body.get("special_offer", ""),
+        "image_style": body.get("image_style", "Professional hotel photography, warm lighting"),
+    }
+    if not context["hotel_name"] or not context["occasion"]:
+        raise RequestError('"hotel_name" and "occasion" are required')
+
+    with metrics.track("api_generate"):
+        prompts = {
+            "caption": build_caption_prompt(context),
+            "image": build_image_prompt(context),
+            "tagline": f"{context['hotel_name']} / {context['occasion']} / {context['audience']}",
+        }
+        content = generate_post_content(prompts["caption"], prompts["image"],
+                                        (context["hotel_name"], context["occasion"], context["audience"]),
+                                        client=client)
+        log_event("api_generate", context, prompts=prompts, content=content, client=client)
+
+        result = {"text": content["text"], "tagline": content["tagline"], "errors": content["errors"],
+                  "timings": content["timings"], "image": None}
+        if content["image"] is not None:
+            result["image"] = _encode_png(content["image"])
+        return result, content["image"]
+
+
+def _composite_job(body: Dict, image: Image.Image, tagline: str) -> str:
+    """The generated image with the requested layout as base64 JPEG, on a render worker."""
+    design = _design({**body, "text": body.get("text", tagline)})
+    with metrics.track("api_render") as sample:
+        data = encode_jpeg(apply_layout(image, **design), quality=90)
+        sample["payload_bytes"] = len(data)
+    return base64.b64encode(data).decode("ascii")
+
+
+class RenderAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, render_workers: int, render_queue: int, io_workers: int, io_queue: int):
+        super().__init__(address, RenderAPIHandler)
+        self.pools = {
+            "render": BoundedPool("render", render_workers, render_queue),
+            "generate": BoundedPool("generate", io_workers, io_queue),
+            "publish": BoundedPool("publish", io_workers, io_queue),
+        }
+        metrics.add_collector("api_pool", self._pool_gauges)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _pool_gauges(self) -> Dict[str, float]:
+        gauges = {}
+        for name, pool in self.pools.items():
+            for key, value in pool.stats().items():
+                gauges[f'{key}{{pool="{name}"}}'] = value
+        return gauges
+
+    def start(self) -> threading.Thread:
+        """Serve from a daemon thread; returns the thread."""
+        thread = threading.Thread(target=self.serve_forever, name="render-api", daemon=True)
+        thread.start()
+        return thread
+
+
+class RenderAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and small chunks are separate writes; see mock_api.py
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self) -> bool:
+        if not RENDER_API_TOKEN or self.headers.get("Authorization", "") == f"Bearer {RENDER_API_TOKEN}":
+            return True
+        self._send_json(401, {"error": "missing or invalid token"})
+        return False
+
+    def _read_json(self) -> Optional[Dict]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > RENDER_API_MAX_BODY_MB * 1024 * 1024:
+            self._send_json(413, {"error": f"request body is larger than {RENDER_API_MAX_BODY_MB:g}MB"})
+            self.close_connection = True
+            return None
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._send_json(400, {"error": f"invalid JSON: {e}"})
+            return None
+        if not isinstance(body, dict):
+            self._send_json(400, {"error": "request body must be a JSON object"})
+            return None
+        return body
+
+    def _submit(self, pool: str, func: Callable, *args) -> Optional[Future]:
+        try:
+            return self.server.pools[pool].submit(func, *args)
+        except PoolFull:
+            self._send_json(503, {"error": f"{pool} queue is full, retry shortly"}, {"Retry-After": "1"})
+            return None
+
+    def _send_failure(self, error: Exception):
+        if isinstance(error, RequestError):
+            self._send_json(400, {"error": str(error)})
+        else:
+            self._send_json(500, {"error": f"{type(error).__name__}: {error}"})
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/healthz":
+            self._send_json(200, {"ok": True, "pools": {name: pool.stats() for name, pool in self.server.pools.items()}})
+        elif path == "/metrics":
+            if not self._authorized():
+                return
+            data = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        handlers = {"/render": self._render, "/generate": self._generate, "/publish": self._publish}
+        handler = handlers.get(self.path.split("?")[0])
+        if handler is None:
+            self._send_json(404, {"error": "not found"})
+            return
+        if not self._authorized():
+            return
+        body = self._read_json()
+        if body is not None:
+            handler(body)
+
+    def _render(self, body: Dict):
+        output = IMAGE_FORMATS.get(str(body.get("format", "jpeg")).lower(), IMAGE_FORMATS["jpeg"])
+        writer = ChunkedWriter(self, output[1])
+        future = self._submit("render", _render_job, body, writer)
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            if writer.started:
+                # Headers are gone; cutting the connection marks the body as incomplete
+                self.close_connection = True
+            else:
+                self._send_failure(e)
+
+    def _generate(self, body: Dict):
+        future = self._submit("generate", _generate_job, body, f"api:{self.client_address[0]}")
+        if future is None:
+            return
+        try:
+            result, image = future.result()
+            if image is not None and body.get("layout"):
+                # Compositing is CPU work, so it takes a render slot like /render does
+                try:
+                    result["composite"] = self.server.pools["render"].submit(
+                        _composite_job, body, image, result["tagline"]).result()
+                except PoolFull:
+                    result["errors"]["composite"] = "render queue is full; send the image to /render"
+        except Exception as e:
+            self._send_failure(e)
+            return
+        self._send_json(200 if not result["errors"] else 502, result)
+
+    def _publish(self, body: Dict):
+        caption = body.get("caption")
+        try:
+            if not isinstance(caption, str) or not caption:
+                raise RequestError('"caption" is required')
+            if body.get("images"):
+                images = {str(platform).lower(): base64.b64decode(data, validate=True)
+                          for platform, data in dict(body["images"]).items()}
+            elif body.get("image"):
+                image = base64.b64decode(body["image"], validate=True)
+                images = {str(platform).lower(): image for platform in body.get("platforms", [])}
+            else:
+                raise RequestError('"image" with "platforms", or "images", is required')
+            if not images:
+                raise RequestError('no platforms given')
+        except (RequestError, binascii.Error, TypeError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        writer = ChunkedWriter(self, "application/x-ndjson")
+
+        def publish_all():
+            # One line per platform as soon as it is done
+            with metrics.track("api_publish"):
+                for result in publish_to_platforms(images, caption):
+                    writer.write(json.dumps(result).encode("utf-8") + b"\n")
+                    writer.flush()
+            writer.close()
+
+        future = self._submit("publish", publish_all)
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            if writer.started:
+                self.close_connection = True
+            else:
+                self._send_failure(e)
+
+
+def main(argv=None) -> int:
+    cpus = os.cpu_count() or 2
+    parser = argparse.ArgumentParser(description="Headless HTTP API for generating, rendering and publishing posts.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(get_secret("RENDER_API_PORT", 8080)))
+    parser.add_argument("--render-workers", type=int, default=cpus, help=f"render threads (default: {cpus} CPUs)")
+    parser.add_argument("--render-queue", type=int, default=2 * cpus,
+                        help="renders that may wait before 503 (default: twice the workers)")
+    parser.add_argument("--io-workers", type=int, default=8, help="generate and publish threads each (default: 8)")
+    parser.add_argument("--io-queue", type=int, default=16, help="generate/publish requests that may wait (default: 16)")
+    args = parser.parse_args(argv)
+
+    server = RenderAPIServer((args.host, args.port), render_workers=max(1, args.render_workers),
+                             render_queue=max(0, args.render_queue), io_workers=max(1, args.io_workers),
+                             io_queue=max(0, args.io_queue))
+    start_post_dispatcher()
+    print(f"Render API listening on {server.url} ({args.render_workers} render workers)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""Durable scheduled-post queue backed by SQLite.
+
+Scheduled posts are rows in a ``scheduled_posts`` table holding the caption,
+the platforms, the due time and the paths of the image files to publish.
+The image files are written next to the database before the row is
+inserted, so a job never points at a missing file.
+
+A PostDispatcher thread publishes due jobs. It asks the database for the
+earliest pending due time (an indexed MIN lookup, not a table scan) and
+sleeps until then, or until a job is scheduled in this process. Jobs are
+claimed inside a ``BEGIN IMMEDIATE`` transaction with a lease, so several
+app replicas can share one database without posting the same job twice.
+A replica that dies mid-job only delays it: the lease expires and another
+dispatcher picks it up. Platforms that already succeeded are recorded on
+the row and are not posted again when a job is retried.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_posts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    due_at REAL NOT NULL,
+    caption TEXT NOT NULL,
+    platforms TEXT NOT NULL,
+    assets TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    claimed_until REAL,
+    results TEXT NOT NULL DEFAULT '{}',
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS scheduled_posts_due ON scheduled_posts (status, due_at);
+CREATE INDEX IF NOT EXISTS scheduled_posts_lease ON scheduled_posts (status, claimed_until);
+"""
+
+# Job states: pending -> claimed -> done | failed (claimed jobs whose lease
+# runs out are treated as pending again)
+PENDING, CLAIMED, DONE, FAILED = "pending", "claimed", "done", "failed"
+
+
+class PostScheduler:
+    """SQLite job table for scheduled posts, safe to share between processes."""
+
+    def __init__(self, db_path: str, asset_dir: Optional[str] = None, lease: float = 300,
+                 max_attempts: int = 5, retry_delay: float = 60):
+        self.db_path = db_path
+        self.asset_dir = asset_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), "scheduled_assets")
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # Set when a job is scheduled in this process, so the dispatcher can wake early
+        self.wakeup = threading.Event()
+        os.makedirs(self.asset_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call: sqlite3 connections are not
+        # shared between threads, and opening one is cheap
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _write_asset(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.asset_dir, name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.asset_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def schedule(self, caption: str, images: Dict[str, bytes], due_at: float) -> int:
+        """Queue a post and return its job id.
+
+        ``images`` maps each platform to the JPEG bytes to publish there, and
+        ``due_at`` is a Unix timestamp.
+        """
+        if not images:
+            raise ValueError("A scheduled post needs at least one platform")
+        token = uuid.uuid4().hex
+        assets = {platform: self._write_asset(f"{token}-{platform}.jpg", data)
+                  for platform, data in images.items()}
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO scheduled_posts (due_at, caption, platforms, assets, created_at) VALUES (?, ?, ?, ?, ?)",
+                (due_at, caption, json.dumps(list(images)), json.dumps(assets), time.time()))
+            job_id = cursor.lastrowid
+        self.wakeup.set()
+        return job_id
+
+    def next_due_at(self) -> Optional[float]:
+        """Earliest time a job becomes claimable, or None if the queue is empty."""
+        with self._connect() as conn:
+            pending = conn.execute("SELECT MIN(due_at) FROM scheduled_posts WHERE status = ?",
+                                   (PENDING,)).fetchone()[0]
+            expiring = conn.execute("SELECT MIN(claimed_until) FROM scheduled_posts WHERE status = ?",
+                                    (CLAIMED,)).fetchone()[0]
+        times = [t for t in (pending, expiring) if t is not None]
+        return min(times) if times else None
+
+    def claim_due(self, worker_id: str, limit: int = 10, now: Optional[float] = None) -> List[Dict]:
+        """Atomically claim up to ``limit`` due jobs for ``worker_id``."""
+        now = time.time() if now is None else now
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the database write lock, so no other
+            # process can claim the same rows between the SELECT and UPDATE
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM scheduled_posts WHERE status = ? AND due_at <= ? "
+                "UNION ALL "
+                "SELECT * FROM scheduled_posts WHERE status = ? AND claimed_until <= ? "
+                "ORDER BY due_at LIMIT ?",
+                (PENDING, now, CLAIMED, now, limit)).fetchall()
+            conn.executemany(
+                "UPDATE scheduled_posts SET status = ?, claimed_by = ?, claimed_until = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                [(CLAIMED, worker_id, now + self.lease, row["id"]) for row in rows])
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return [self._job(row, status=CLAIMED, claimed_by=worker_id, claimed_until=now + self.lease,
+                          attempts=row["attempts"] + 1) for row in rows]
+
+    @staticmethod
+    def _job(row: sqlite3.Row, **overrides) -> Dict:
+        job = dict(row)
+        job["platforms"] = json.loads(job["platforms"])
+        job["assets"] = json.loads(job["assets"])
+        job["results"] = json.loads(job["results"])
+        job.update(overrides)
+        return job
+
+    def finish(self, job: Dict, results: Dict[str, bool], error: Optional[str] = None):
+        """Record a run's per-platform results, retrying failed platforms later.
+
+        Only the worker holding the claim can update the job; if its lease
+        expired and another dispatcher took over, the update is dropped.
+        """
+        results = {**job["results"], **results}
+        remaining = [platform for platform in job["platforms"] if not results.get(platform)]
+        if not remaining:
+            status, due_at = DONE, job["due_at"]
+        elif job["attempts"] >= self.max_attempts:
+            status, due_at = FAILED, job["due_at"]
+        else:
+            # Exponential backoff between attempts
+            status, due_at = PENDING, time.time() + self.retry_delay * 2 ** (job["attempts"] - 1)
+        if error is None and remaining:
+            error = f"Publishing failed for {', '.join(remaining)}"
+
+        with self._connect() as conn:
+            updated = conn.execute(
+                "UPDATE scheduled_posts SET status = ?, due_at = ?, results = ?, last_error = ?, "
+                "claimed_by = NULL, claimed_until = NULL, finished_at = ? "
+                "WHERE id = ? AND status = ? AND claimed_by = ?",
+                (status, due_at, json.dumps(results), error, time.time() if status in (DONE, FAILED) else None,
+                 job["id"], CLAIMED, job["claimed_by"])).rowcount
+        if updated and status in (DONE, FAILED):
+            self._remove_assets(job["assets"])
+
+    def _remove_assets(self, assets: Dict[str, str]):
+        for path in assets.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cancel(self, job_id: int) -> bool:
+        """Delete a job that has not been claimed yet."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT assets FROM scheduled_posts WHERE id = ? AND status = ?",
+                               (job_id, PENDING)).fetchone()
+            if row is None:
+                return False
+            deleted = conn.execute("DELETE FROM scheduled_posts WHERE id = ? AND status = ?",
+                                   (job_id, PENDING)).rowcount
+        if deleted:
+            self._remove_assets(json.loads(row["assets"]))
+        return bool(deleted)
+
+    def jobs(self, statuses=(PENDING, CLAIMED, FAILED), limit: int = 100) -> List[Dict]:
+        """Jobs in the given states, soonest first."""
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT * FROM scheduled_posts WHERE status IN ({placeholders}) "
+                                "ORDER BY due_at LIMIT ?", (*statuses, limit)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM scheduled_posts GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (PENDING, CLAIMED, DONE, FAILED)}
+
+
+class PostDispatcher(threading.Thread):
+    """Background thread that publishes due jobs from a PostScheduler.
+
+    ``publish(platform, image_bytes, caption)`` is called once per platform
+    and returns True on success, or a dict with "ok" and "error" keys. Up
+    to ``workers`` jobs are published at a time. Between batches the thread
+    sleeps until the next due time, capped at ``max_sleep`` so jobs added
+    by other processes are still noticed.
+    """
+
+    def __init__(self, scheduler: PostScheduler, publish: Callable[[str, bytes, str], object],
+                 workers: int = 4, max_sleep: float = 30):
+        super().__init__(name="bookingjini-dispatcher", daemon=True)
+        self.scheduler = scheduler
+        self.publish = publish
+        self.workers = workers
+        self.max_sleep = max_sleep
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._stop_event = threading.Event()
+
+    def run_job(self, job: Dict):
+        results, error = {}, None
+        try:
+            for platform in job["platforms"]:
+                if job["results"].get(platform):
+                    continue
+                with open(job["assets"][platform], "rb") as f:
+                    image_data = f.read()
+                outcome = self.publish(platform, image_data, job["caption"])
+                if isinstance(outcome, dict):
+                    results[platform] = bool(outcome.get("ok"))
+                    error = outcome.get("error") or error
+                else:
+                    results[platform] = bool(outcome)
+        except Exception as e:
+            error = str(e)
+        self.scheduler.finish(job, results, error)
+
+    def run_once(self, executor: ThreadPoolExecutor) -> int:
+        """Claim and publish one batch of due jobs; returns how many ran."""
+        jobs = self.scheduler.claim_due(self.worker_id, limit=self.workers)
+        for future in [executor.submit(self.run_job, job) for job in jobs]:
+            future.result()
+        return len(jobs)
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bookingjini-publish") as executor:
+            while not self._stop_event.is_set():
+                try:
+                    if self.run_once(executor):
+                        continue
+                    next_due = self.scheduler.next_due_at()
+                except sqlite3.Error:
+                    next_due = None
+                timeout = self.max_sleep if next_due is None else min(self.max_sleep, max(0.0, next_due - time.time()))
+                self.scheduler.wakeup.wait(timeout)
+                self.scheduler.wakeup.clear()
+
+    def stop(self):
+        self._stop_event.set()
+        self.scheduler.wakeup.set()
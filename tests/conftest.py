@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_api import MockAPIServer  # noqa: E402
+
+
+@pytest.fixture
+def mock_api():
+    """mock_api.py served from a background thread for the duration of a test."""
+    server = MockAPIServer(("127.0.0.1", 0))
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+import backend
+from ratelimit import ProviderLimiter, RateLimitError, TokenBucket, backoff_delay
+
+
+def test_token_bucket_spends_its_burst_then_reports_the_wait():
+    bucket = TokenBucket(60, burst=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(1.0, abs=0.05)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_token_bucket_acquire_gives_up_at_the_timeout():
+    bucket = TokenBucket(60, burst=1)
+    assert bucket.acquire(timeout=0)
+    start = time.monotonic()
+    assert not bucket.acquire(timeout=0.2)
+    assert time.monotonic() - start < 0.2
+    bucket = TokenBucket(600, burst=1)
+    bucket.take(1)
+    assert bucket.acquire(timeout=1)  # refilled within 0.1s
+
+
+def test_token_bucket_never_waits_for_more_than_its_capacity():
+    bucket = TokenBucket(60, burst=2)
+    assert bucket.acquire(100, timeout=0)
+
+
+def enqueue(limiter, client, name, served):
+    """Start a thread acquiring for ``client`` and wait until it is queued."""
+    depth = limiter.queue_depth()
+    thread = threading.Thread(target=lambda: (limiter.acquire(client=client), served.append(name)))
+    thread.start()
+    while limiter.queue_depth() == depth:
+        time.sleep(0.001)
+    return thread
+
+
+def test_provider_limiter_serves_clients_round_robin():
+    limiter = ProviderLimiter("test", rpm=1e9)
+    limiter.penalize(0.2)  # hold the queue while it fills
+    served = []
+    threads = [enqueue(limiter, "a", name, served) for name in ("a1", "a2", "a3")]
+    threads.append(enqueue(limiter, "b", "b1", served))
+    for thread in threads:
+        thread.join(5)
+    assert served == ["a1", "b1", "a2", "a3"]
+    assert limiter.stats()["served"] == 4
+
+
+def test_penalize_delays_every_caller():
+    limiter = ProviderLimiter("test", rpm=1e9)
+    limiter.penalize(0.2)
+    assert limiter.acquire() >= 0.15
+    assert limiter.acquire() < 0.05
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_provider_limiter_raises_when_the_wait_exceeds_max_wait():
+    limiter = ProviderLimiter("test", rpm=60, burst_seconds=1, max_wait=0.1)
+    limiter.acquire()
+    with pytest.raises(RateLimitError):
+        limiter.acquire()
+    assert limiter.queue_depth() == 0
+
+
+def test_tokens_per_minute_budget():
+    limiter = ProviderLimiter("test", rpm=1e9, tpm=600, burst_seconds=1, max_wait=0.05)
+    limiter.acquire(tokens=10)
+    with pytest.raises(RateLimitError):
+        limiter.acquire(tokens=10)
+
+
+def test_backoff_delay_bounds():
+    for attempt in range(1, 10):
+        assert 0 <= backoff_delay(attempt, base=1, cap=8) <= min(8, 2 ** (attempt - 1))
+    assert 5 <= backoff_delay(1, retry_after=5) <= 6
+
+
+@pytest.fixture
+def throttled_groq(mock_api, monkeypatch):
+    """Mock API answering 429 after one Groq request per second."""
+    mock_api.rate_limit = 1
+    monkeypatch.setattr(backend, "rate_limiters", {"groq": ProviderLimiter("Groq", rpm=1e9)})
+    return mock_api, f"{mock_api.url}/openai/v1/chat/completions"
+
+
+def test_limited_post_retries_after_a_429(throttled_groq):
+    server, url = throttled_groq
+    kwargs = {"json": {"messages": []}, "headers": {"Authorization": "Bearer test"}, "timeout": 10}
+    assert backend._limited_post("groq", url, **kwargs).status_code == 200
+    assert backend._limited_post("groq", url, **kwargs).status_code == 200
+    assert server.counts["groq"] == {"ok": 2, "failed": 0, "throttled": 1}
+    assert backend.rate_limiters["groq"].stats()["throttled"] == 1
+
+
+def test_limited_post_gives_up_when_retries_run_out(throttled_groq, monkeypatch):
+    server, url = throttled_groq
+    monkeypatch.setattr(backend, "RATE_LIMIT_RETRIES", 0)
+    kwargs = {"json": {"messages": []}, "headers": {"Authorization": "Bearer test"}, "timeout": 10}
+    backend._limited_post("groq", url, **kwargs)
+    with pytest.raises(RateLimitError):
+        backend._limited_post("groq", url, **kwargs)
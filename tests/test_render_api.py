@@ -0,0 +1,108 @@
+import base64
+import io
+
+import pytest
+import requests
+from PIL import Image
+
+import render_api
+from render_api import IMAGE_FORMATS, ChunkedWriter, RenderAPIServer
+
+
+class FakeHandler:
+    """Just enough of BaseHTTPRequestHandler for ChunkedWriter."""
+
+    def __init__(self):
+        self.wfile = io.BytesIO()
+        self.status = None
+        self.headers = {}
+
+    def send_response(self, status):
+        self.status = status
+
+    def send_header(self, name, value):
+        self.headers[name] = value
+
+    def end_headers(self):
+        pass
+
+
+def dechunk(data: bytes) -> bytes:
+    body, position = b"", 0
+    while True:
+        end = data.index(b"\r\n", position)
+        size = int(data[position:end], 16)
+        if size == 0:
+            assert data[end:] == b"\r\n\r\n"
+            return body
+        body += data[end + 2:end + 2 + size]
+        assert data[end + 2 + size:end + 4 + size] == b"\r\n"
+        position = end + 4 + size
+
+
+def photo(size=(640, 480)) -> Image.Image:
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    image.paste((200, 40, 40), (40, 40, 200, 160))
+    return image
+
+
+@pytest.mark.parametrize("output", sorted(IMAGE_FORMATS))
+def test_each_format_saves_into_chunked_writer(output):
+    image_format, content_type = IMAGE_FORMATS[output]
+    handler = FakeHandler()
+    writer = ChunkedWriter(handler, content_type)
+    options = {"compress_level": 1} if image_format == "PNG" else {"quality": 90}
+
+    photo().save(writer, format=image_format, **options)
+    writer.close()
+
+    assert handler.status == 200
+    assert handler.headers == {"Content-Type": content_type, "Transfer-Encoding": "chunked"}
+    body = dechunk(handler.wfile.getvalue())
+    assert len(body) == writer.bytes_sent
+    decoded = Image.open(io.BytesIO(body))
+    assert decoded.format == image_format
+    assert decoded.size == (640, 480)
+    decoded.load()
+
+
+def test_nothing_is_sent_before_the_first_write():
+    handler = FakeHandler()
+    ChunkedWriter(handler, "image/jpeg").close()
+    assert handler.status is None
+    assert handler.wfile.getvalue() == b""
+
+
+@pytest.fixture
+def server():
+    server = RenderAPIServer(("127.0.0.1", 0), render_workers=2, render_queue=2, io_workers=2, io_queue=2)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("output", sorted(IMAGE_FORMATS))
+def test_render_streams_every_format(server, output):
+    buffer = io.BytesIO()
+    photo((512, 512)).save(buffer, format="PNG")
+    body = {"image": base64.b64encode(buffer.getvalue()).decode("ascii"), "text": "Diwali at the palace",
+            "layout": "Festive Diya", "platform": "twitter", "format": output}
+
+    response = requests.post(f"{server.url}/render", json=body, timeout=30)
+
+    assert response.status_code == 200
+    assert response.headers["Transfer-Encoding"] == "chunked"
+    assert response.headers["Content-Type"] == IMAGE_FORMATS[output][1]
+    decoded = Image.open(io.BytesIO(response.content))
+    assert decoded.format == IMAGE_FORMATS[output][0]
+    assert decoded.size == render_api.PLATFORM_RENDITIONS["twitter"]
+
+
+def test_render_rejects_a_bad_quality(server):
+    buffer = io.BytesIO()
+    photo((64, 64)).save(buffer, format="PNG")
+    response = requests.post(f"{server.url}/render", timeout=30,
+                             json={"image": base64.b64encode(buffer.getvalue()).decode("ascii"), "quality": "abc"})
+    assert response.status_code == 400
+    assert "quality" in response.json()["error"]
@@ -0,0 +1,127 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import backend
+from scheduler import CLAIMED, DONE, FAILED, PENDING, PostDispatcher, PostScheduler
+
+IMAGES = {"instagram": b"ig-jpeg", "twitter": b"tw-jpeg"}
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return PostScheduler(str(tmp_path / "schedule.db"), lease=60, max_attempts=3, retry_delay=10)
+
+
+def status(scheduler, job_id):
+    return {job["id"]: job for job in scheduler.jobs((PENDING, CLAIMED, DONE, FAILED))}[job_id]
+
+
+def test_claim_due_only_returns_due_jobs(scheduler):
+    due = scheduler.schedule("now", IMAGES, due_at=1000)
+    scheduler.schedule("later", IMAGES, due_at=2000)
+
+    jobs = scheduler.claim_due("w1", now=1500)
+    assert [job["id"] for job in jobs] == [due]
+    assert jobs[0]["attempts"] == 1
+    assert jobs[0]["claimed_until"] == 1500 + scheduler.lease
+    assert scheduler.claim_due("w2", now=1500) == []
+    # The lease runs out before the next job is due
+    assert scheduler.next_due_at() == 1500 + scheduler.lease
+
+
+def test_expired_lease_is_reclaimed_and_the_stale_finish_dropped(scheduler):
+    job_id = scheduler.schedule("post", IMAGES, due_at=1000)
+    [stale] = scheduler.claim_due("w1", now=1000)
+    assert scheduler.claim_due("w2", now=1000 + scheduler.lease - 1) == []
+
+    [job] = scheduler.claim_due("w2", now=1000 + scheduler.lease)
+    assert job["id"] == job_id and job["attempts"] == 2
+
+    scheduler.finish(stale, {"instagram": True, "twitter": True})
+    assert status(scheduler, job_id)["status"] == CLAIMED
+    assert status(scheduler, job_id)["claimed_by"] == "w2"
+    scheduler.finish(job, {"instagram": True, "twitter": True})
+    assert status(scheduler, job_id)["status"] == DONE
+    assert not any(os.path.exists(path) for path in job["assets"].values())
+
+
+def test_failed_platforms_are_retried_with_backoff_until_max_attempts(scheduler, monkeypatch):
+    monkeypatch.setattr("scheduler.time.time", lambda: 5000.0)
+    job_id = scheduler.schedule("post", IMAGES, due_at=1000)
+
+    [job] = scheduler.claim_due("w1", now=1000)
+    scheduler.finish(job, {"instagram": True, "twitter": False})
+    row = status(scheduler, job_id)
+    assert row["status"] == PENDING
+    assert row["due_at"] == 5000 + scheduler.retry_delay
+    assert row["results"] == {"instagram": True, "twitter": False}
+    assert row["last_error"] == "Publishing failed for twitter"
+
+    [job] = scheduler.claim_due("w1", now=6000)
+    scheduler.finish(job, {"twitter": False}, "Twitter returned 503")
+    assert status(scheduler, job_id)["due_at"] == 5000 + scheduler.retry_delay * 2
+
+    [job] = scheduler.claim_due("w1", now=6000)
+    assert job["attempts"] == scheduler.max_attempts
+    scheduler.finish(job, {"twitter": False})
+    row = status(scheduler, job_id)
+    assert row["status"] == FAILED
+    assert row["results"] == {"instagram": True, "twitter": False}
+    assert not any(os.path.exists(path) for path in job["assets"].values())
+
+
+def test_concurrent_workers_never_claim_a_job_twice(scheduler):
+    for i in range(40):
+        scheduler.schedule(f"post {i}", {"instagram": b"x"}, due_at=1000)
+    claimed, start = [], threading.Barrier(8)
+
+    def worker(n):
+        start.wait()
+        while True:
+            jobs = scheduler.claim_due(f"w{n}", limit=3, now=1000)
+            if not jobs:
+                return
+            claimed.extend(job["id"] for job in jobs)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert sorted(claimed) == sorted(set(claimed)) and len(claimed) == 40
+
+
+def test_cancel_only_removes_unclaimed_jobs(scheduler):
+    pending = scheduler.schedule("pending", IMAGES, due_at=2000)
+    claimed = scheduler.schedule("claimed", IMAGES, due_at=1000)
+    scheduler.claim_due("w1", now=1000)
+    assert scheduler.cancel(pending)
+    assert not scheduler.cancel(claimed)
+    assert [job["id"] for job in scheduler.jobs()] == [claimed]
+
+
+def test_dispatcher_publishes_through_the_social_api(tmp_path, mock_api, monkeypatch):
+    monkeypatch.setattr(backend, "SOCIAL_API_BASE_URL", f"{mock_api.url}/social")
+    monkeypatch.setattr(backend, "SOCIAL_MEDIA_CREDENTIALS", {"instagram": "test", "twitter": ""})
+    scheduler = PostScheduler(str(tmp_path / "schedule.db"), retry_delay=0)
+    dispatcher = PostDispatcher(scheduler, backend.publish_to_platform, workers=2)
+    job_id = scheduler.schedule("Diwali at the palace", IMAGES, due_at=0)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert dispatcher.run_once(executor) == 1
+        row = status(scheduler, job_id)
+        assert row["status"] == PENDING
+        assert row["results"] == {"instagram": True, "twitter": False}
+        assert "Twitter credentials" in row["last_error"]
+
+        monkeypatch.setitem(backend.SOCIAL_MEDIA_CREDENTIALS, "twitter", "test")
+        assert dispatcher.run_once(executor) == 1
+        assert dispatcher.run_once(executor) == 0
+
+    assert status(scheduler, job_id)["status"] == DONE
+    # Instagram succeeded on the first run and was not posted again
+    assert mock_api.counts == {"instagram": {"ok": 1, "failed": 0, "throttled": 0},
+                               "twitter": {"ok": 1, "failed": 0, "throttled": 0}}
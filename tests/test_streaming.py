@@ -0,0 +1,102 @@
+import io
+import json
+from itertools import combinations
+
+import pytest
+import requests
+
+import backend
+from cache import ResponseCache
+from ratelimit import ProviderLimiter
+
+BODY = 'Diyas \\"glow\\" at the caf\\u00e9\\n\\tand on the lake \\ud83e\\ude94 \\\\ नमस्ते'
+
+
+def decode_in_pieces(pieces):
+    """Feed the pieces to _partial_json_string as the streaming decoder does."""
+    buffer, position, finished, out = "", 0, False, []
+    for piece in pieces:
+        buffer += piece
+        if finished:
+            continue
+        text, position, finished = backend._partial_json_string(buffer, position)
+        out.append(text)
+    return "".join(out), finished, position
+
+
+def test_partial_json_string_across_every_split():
+    raw = BODY + '", "tagline": "x"}'
+    expected = json.loads(f'"{BODY}"')
+    for i, j in combinations(range(1, len(raw)), 2):
+        text, finished, position = decode_in_pieces([raw[:i], raw[i:j], raw[j:]])
+        assert text == expected, (i, j)
+        assert finished
+        assert position == len(BODY) + 1
+
+
+def test_partial_json_string_one_character_at_a_time():
+    text, finished, _ = decode_in_pieces(list(BODY + '"'))
+    assert text == json.loads(f'"{BODY}"')
+    assert finished
+
+
+def test_partial_json_string_holds_back_incomplete_escapes():
+    for prefix in ("ab\\", "ab\\u00", "ab\\ud83e", "ab\\ud83e\\ude"):
+        assert backend._partial_json_string(prefix, 0) == ("ab", 2, False)
+
+
+def sse_response(events) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "text/event-stream"
+    response.raw = io.BytesIO("".join(events).encode("utf-8"))
+    return response
+
+
+def test_iter_stream_tokens_decodes_utf8_and_stops_at_done():
+    def event(content):
+        return f"data: {json.dumps({'choices': [{'delta': {'content': content}}]}, ensure_ascii=False)}\n\n"
+
+    events = [": keep-alive\n\n", event("Café "), 'data: {"choices": [{"delta": {}}]}\n\n',
+              event("दिवाली"), "data: [DONE]\n\n", event("after done")]
+    assert list(backend._iter_stream_tokens(sse_response(events))) == ["Café ", "दिवाली"]
+
+
+@pytest.fixture
+def groq(mock_api, monkeypatch):
+    """Point the backend's Groq calls at the mock API, with fresh caches and no rate limit."""
+    monkeypatch.setattr(backend, "GROQ_API_KEY", "test")
+    monkeypatch.setattr(backend, "GROQ_CHAT_URL", f"{mock_api.url}/openai/v1/chat/completions")
+    monkeypatch.setattr(backend, "CAPTION_STREAMING", True)
+    monkeypatch.setattr(backend, "llm_cache", ResponseCache(16, 3600))
+    monkeypatch.setattr(backend, "rate_limiters", {"groq": ProviderLimiter("Groq", rpm=1e9),
+                                                   "stability": ProviderLimiter("Stability AI", rpm=1e9)})
+    return mock_api
+
+
+def test_combined_stream_yields_the_caption_from_one_request(groq):
+    stats = {}
+    tokens = list(backend.stream_caption_and_tagline("A Diwali post", ("Rambagh Palace", "Diwali", "Families"),
+                                                     stats))
+
+    assert len(tokens) > 1  # decoded as the JSON arrived, not in one piece
+    assert stats["mode"] == "stream"
+    assert stats["tagline"]
+    assert groq.counts["groq"]["ok"] == 1
+    cached = backend._parse_combined(backend.llm_cache.get(backend.normalized_payload_key(
+        backend._combined_request_data("A Diwali post", "Rambagh Palace", "Diwali", "Families"))))
+    assert "".join(tokens) == cached["text"]
+    assert stats["tagline"] == cached["tagline"]
+
+
+def test_caption_stream_matches_the_mock_reply(groq):
+    stats = {}
+    caption = "".join(backend.stream_text_with_llama("A Diwali post", stats))
+    assert stats["mode"] == "stream"
+    assert caption.strip()
+    assert groq.counts["groq"]["ok"] == 1
+
+
+def test_empty_streams_fall_back_to_a_caption(groq, monkeypatch):
+    monkeypatch.setattr(backend, "_stream_caption", lambda prompt, stats: iter(["", ""]))
+    assert list(backend.stream_text_with_llama("A Diwali post")) == [backend.GENERATION_FALLBACKS["text"]]